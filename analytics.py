@@ -0,0 +1,136 @@
+import csv
+
+COUNTERS = ['coups', 'banco', 'punto', 'tie', 'naturals', 'punto_thirds',
+            'banco_thirds']
+
+class DepthProfile:
+    """Outcome, natural and third card counters by the depth of the shoe at
+    which each coup is dealt. The counters of every depth bin are allocated
+    upfront and a coup updates them in constant time, so the profile keeps
+    the same size however many coups are recorded.
+
+    Args:
+        max_cards: int, number of cards of a full shoe.
+        bin_size: int, cards left covered by each bin. Optional, default
+            value 1.
+
+    Attributes:
+        bin_size: int, cards left covered by each bin.
+        num_bins: int, number of bins.
+        coups: int, number of recorded coups.
+
+    Raises:
+        ValueError: If max_cards or bin_size is not positive.
+    """
+    def __init__(self, max_cards, bin_size=1):
+        if max_cards < 1 or bin_size < 1:
+            raise ValueError('Cards and bin size must be positive.')
+        self._max_cards = max_cards
+        self._bin_size = bin_size
+        self._num_bins = max_cards // bin_size + 1
+        self._counts = {name: [0] * self._num_bins for name in COUNTERS}
+
+    @property
+    def bin_size(self):
+        """Returns the cards left covered by each bin."""
+        return self._bin_size
+
+    @property
+    def num_bins(self):
+        """Returns the number of bins."""
+        return self._num_bins
+
+    @property
+    def coups(self):
+        """Returns the number of recorded coups."""
+        return sum(self._counts['coups'])
+
+    def record(self, cards_left, result, natural, punto_third, banco_third):
+        """Adds a coup to the bin of the cards left when it was dealt.
+
+        Args:
+            cards_left: int, cards in the shoe when the hands were dealt.
+            result: str, banco, punto or tie.
+            natural: bool, if there was a natural.
+            punto_third: bool, if punto drew a third card.
+            banco_third: bool, if banco drew a third card.
+        """
+        i = min(cards_left, self._max_cards) // self._bin_size
+        counts = self._counts
+        counts['coups'][i] += 1
+        counts[result][i] += 1
+        if natural:
+            counts['naturals'][i] += 1
+        if punto_third:
+            counts['punto_thirds'][i] += 1
+        if banco_third:
+            counts['banco_thirds'][i] += 1
+
+    def record_game(self, game, cards_left):
+        """Adds the last coup played on a Game instance.
+
+        Args:
+            game: Game object, with a finished coup.
+            cards_left: int, cards in the shoe before the hands were dealt.
+        """
+        punto_third = len(game.punto_values) == 3
+        banco_third = len(game.banco_values) == 3
+        self.record(cards_left, game.game_result(),
+                    not punto_third and not banco_third and
+                    (game.punto_value >= 8 or game.banco_value >= 8),
+                    punto_third, banco_third)
+
+    def merge(self, other):
+        """Adds the counters of another profile with the same bins.
+
+        Raises:
+            ValueError: If the bins do not match.
+        """
+        if (other._max_cards, other._bin_size) != (self._max_cards, self._bin_size):
+            raise ValueError('Depth profiles have different bins.')
+        for name in COUNTERS:
+            counts = self._counts[name]
+            for i, count in enumerate(other._counts[name]):
+                counts[i] += count
+
+    def to_dict(self):
+        """Returns the profile as a dict of plain types, to be sent or saved."""
+        return {'max_cards': self._max_cards, 'bin_size': self._bin_size,
+                'counts': self._counts}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Creates a profile from a dict returned by to_dict()."""
+        profile = cls(data['max_cards'], data['bin_size'])
+        for name in COUNTERS:
+            profile._counts[name] = list(data['counts'][name])
+        return profile
+
+    def rows(self):
+        """Yields the bins with coups in dealing order, from the most cards
+        left at the top of the shoe to the fewest, as dicts with the range of
+        cards left, the counters and the rate of each counter per coup.
+        """
+        for i in range(self._num_bins - 1, -1, -1):
+            coups = self._counts['coups'][i]
+            if not coups:
+                continue
+            row = {'cards_left_from': i * self._bin_size,
+                   'cards_left_to': min((i + 1) * self._bin_size - 1, self._max_cards)}
+            for name in COUNTERS:
+                row[name] = self._counts[name][i]
+            for name in COUNTERS[1:]:
+                row[f'{name}_rate'] = self._counts[name][i] / coups
+            yield row
+
+    def write(self, file_name):
+        """Writes the profile to a CSV file, one row per bin."""
+        fields = ['cards_left_from', 'cards_left_to'] + COUNTERS + \
+                 [f'{name}_rate' for name in COUNTERS[1:]]
+        with open(file_name, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fields)
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+    def __repr__(self):
+        return f'DepthProfile({self._max_cards}, {self._bin_size})'
@@ -1,12 +1,23 @@
 import time
+import argparse
+from ledger import Ledger
 from rules import Table
+from storage import PlayerStore
 
 class Cli:
     """Command line interface of the game. Only interacts with Table object in
     order to receive input from the game logic.
+
+    Args:
+        file_name: str, SQLite file to keep the players and bets between
+            sessions. Optional.
+        ledger_name: str, ledger file to append the opening balances and
+            every settlement to. Optional.
     """
-    def __init__(self):
-        self._game = Table()
+    def __init__(self, file_name=None, ledger_name=None):
+        store = PlayerStore(file_name) if file_name else None
+        ledger = Ledger(ledger_name) if ledger_name else None
+        self._game = Table(store=store, ledger=ledger)
         self._quit = False
         self._options = {
             '1': self.status,
@@ -198,6 +209,7 @@ Options:
         """Quits the game uppon confirmation from the user."""
         quit_input = input('Do you really wish to quit? <y/n>: ')
         if quit_input.lower() in ['y', 'yes']:
+            self._game.close()
             self._quit = True
         elif quit_input.lower() in ['n', 'no']:
             return
@@ -206,4 +218,10 @@ Options:
             self.quit()
 
 if __name__ == '__main__':
-    Cli().run()
+    parser = argparse.ArgumentParser(description='Plays baccarat on the command line.')
+    parser.add_argument('-f', action='store', dest='file', default=None,
+                        help='SQLite file to keep players and bets between sessions')
+    parser.add_argument('-l', action='store', dest='ledger', default=None,
+                        help='ledger file to append every settlement to')
+    args = parser.parse_args()
+    Cli(args.file, args.ledger).run()
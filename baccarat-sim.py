@@ -1,85 +1,85 @@
 import datetime
 import argparse
-from rules import Game
-
-def hand_values(hand):
-    """Creates a list of strings with the values of a hand."""
-    values = []
-    for i in range(3):
-        try:
-            values.append(str(hand[i]))
-        except IndexError:
-            values.append('x')
-    return values
+import random
+from analytics import DepthProfile
+from history import CoupHistory
+from shuffles import MODELS
+from simulation import play_shoes, write_totals
+from distributed import coordinate, work
 
 def main():
 
-    # Counters
-    shoe_count = 0
-    game_count = 0
-    total_wins = {'banco': 0, 'punto': 0, 'tie': 0}
-
     # Argument parser
     parser = argparse.ArgumentParser(description='Simulates baccarat games to a text file.')
     parser.add_argument('-s', action='store', dest='shoes', default=10000,
                         type=int, help='number of shoes to be simulated, default 10000')
     parser.add_argument('-d', action='store', dest='decks', default=8,
                         type=int, help='number of decks per shoe, default 8')
+    parser.add_argument('--shuffle', action='store', dest='shuffle', default='perfect',
+                        choices=MODELS, help='shuffle model of the shoes, default perfect')
+    parser.add_argument('--seed', action='store', dest='seed', default=None,
+                        type=int, help='seed to repeat a simulation')
+    parser.add_argument('-o', action='store', dest='history', default=None,
+                        help='also record the coups to a queryable history file')
+    parser.add_argument('--depth', action='store', dest='depth', default=None,
+                        help='also write outcome rates by shoe depth to a CSV file')
+    parser.add_argument('--depth-bin', action='store', dest='depth_bin', default=1,
+                        type=int, help='cards left per depth bin, default 1')
+    parser.add_argument('--serve', action='store', dest='port', default=None, type=int,
+                        help='coordinate workers connecting to this port instead of '
+                        'playing the shoes')
+    parser.add_argument('--local', action='store', dest='local', default=0, type=int,
+                        help='play the shoes on this number of local worker processes')
+    parser.add_argument('--worker', action='store', dest='coordinator', default=None,
+                        metavar='HOST:PORT', help='play shoes for a coordinator')
+    parser.add_argument('--part', action='store', dest='part', default=100, type=int,
+                        help='shoes handed out to a worker at once, default 100')
     args = parser.parse_args()
 
-    # Create game object
-    sim = Game()
-    sim.create_shoe(args.decks)
+    # Worker mode
+    if args.coordinator:
+        host, port = args.coordinator.rsplit(':', 1)
+        work(host, int(port))
+        return
+
+    distributed = args.port is not None or args.local > 0
+    if distributed and args.history:
+        parser.error('-o is not supported when coordinating workers')
+    if distributed and args.seed is None:
+        args.seed = random.randrange(2 ** 32)
+        print(f'Seed: {args.seed}')
+
+    history = CoupHistory(args.history) if args.history else None
+    depth = DepthProfile(args.decks * 52, args.depth_bin) if args.depth else None
 
     # Set file name
     now = datetime.datetime.now()
     file_name = f'{args.decks}_{args.shoes}_{now.strftime("%d%m%y%H%M%S")}.txt'
 
+    # Progress
+    def progress(shoe_count):
+        print(f'Progress: {round((shoe_count / args.shoes) * 100, 1)}%', end='\r')
+
     # Open file
     with open(file_name, 'w') as sim_file:
+        if distributed:
+            params = {'decks': args.decks, 'shoes': args.shoes,
+                      'seed': args.seed, 'shuffle': args.shuffle}
+            if depth is not None:
+                params['depth_bin'] = args.depth_bin
+            total_wins, game_count, depth = coordinate(
+                sim_file, params, args.port or 0, args.part,
+                progress=progress, local_workers=args.local)
+        else:
+            total_wins, game_count = play_shoes(sim_file, args.decks, 0, args.shoes,
+                                                args.shuffle, args.seed, history,
+                                                progress, depth)
+            write_totals(sim_file, total_wins, game_count)
 
-        # Run through num_shoes
-        for i in range(args.shoes):
-            shoe_wins = {'banco': 0, 'punto': 0, 'tie': 0}
-            shoe_count += 1
-            sim_file.write(f'\nShoe number {i + 1}\n\n')
-
-            # While the shoe has more than 5 cards
-            while sim.num_cards >= 6:
-                result = []
-                game_count += 1
-
-                # Baccarat game
-                sim.deal_hands()
-                if not sim.is_natural():
-                    sim.draw_thirds()
-                game_result = sim.game_result()
-                shoe_wins[game_result] += 1
-                total_wins[game_result] += 1
-
-                # Append to results list
-                result.append(game_result.title()[0])
-                result.append(str(sim.banco_value))
-                result.append(str(sim.punto_value))
-                result.extend(hand_values(sim.banco_values))
-                result.extend(hand_values(sim.punto_values))
-                sim_file.write(','.join(result) + '\n')
-
-                # Progress
-                progress = round((shoe_count / args.shoes) * 100, 1)
-                print(f'Progress: {progress}%', end='\r')
-
-            # Shoe results
-            sim_file.write('\nShoe results:\n')
-            for win in shoe_wins:
-                sim_file.write(f'{win.title()}:\t{shoe_wins[win]}\n')
-            sim.create_shoe(args.decks)
-
-        # Total results
-        sim_file.write('\nTotal results:\n')
-        for win in total_wins:
-            sim_file.write(f'{win.title()}:\t{total_wins[win]}\t\
-({round((total_wins[win]/game_count) * 100, 4)}%)\n')
+    if history is not None:
+        history.close()
+    if depth is not None:
+        depth.write(args.depth)
 
 if __name__ == '__main__':
     main()
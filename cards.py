@@ -1,4 +1,5 @@
 import random
+from shuffles import PerfectShuffle
 
 SUITS = ['hearts', 'spades', 'clubs', 'diamonds']
 RANKS = ['ace', 2, 3, 4, 5, 6, 7, 8, 9, 10, 'jack', 'queen', 'king']
@@ -45,6 +46,11 @@ class Card:
         """Get card suit."""
         return self._suit
 
+    @property
+    def code(self):
+        """Get card code, the position of the card on DECK."""
+        return SUITS.index(self._suit) * len(RANKS) + RANKS.index(self._rank)
+
     def __add__(self, other):
         return (self._value + other) % 10
 
@@ -64,31 +70,77 @@ class Card:
         """Return a string with the rank and suit of the card."""
         return f'{self._rank} of {self._suit}'
 
+DECK = [Card(rank, suit) for suit in SUITS for rank in RANKS]
+VALUES = [card.value for card in DECK]
+
 class Shoe:
     """Shoe with num_decks shuffled decks. All cards used in the game
     will be drawn from this set.
 
+    The shoe keeps the cards as a bytearray of codes, the positions of the
+    cards on DECK, and draws the shared Card instances of DECK.
+
     Args:
         num_decks: int, number of decks on the shoe.
+        shuffle: shuffle model from shuffles, used whenever decks are added.
+            Optional, defaults to a perfect shuffle.
+        rng: random number generator, a random.Random instance. Optional,
+            defaults to the random module.
 
     Attributes:
         num_decks: int, number of decks on the shoe.
+        num_cards: int, number of cards left on the shoe.
+        num_dealt: int, number of cards drawn from the shoe.
         cards: list, all the instances of the object PlayinCard
             on the Shoe object.
+        shuffle: shuffle model of the shoe.
 
     Raises:
         TypeError: If the num_decks is not an integer.
         ValueError: If the num_decks is not positive.
     """
-    def __init__(self, num_decks):
+    def __init__(self, num_decks, shuffle=None, rng=None):
         if not isinstance(num_decks, int):
             raise TypeError('Number of decks must be an integer.')
         elif num_decks < 1:
             raise ValueError('Number of decks must be positive.')
         self._num_decks = num_decks
-        self._cards = []
+        self._shuffle = shuffle if shuffle else PerfectShuffle()
+        self._rng = rng if rng else random
+        self._cards = bytearray()
+        self._discards = bytearray()
+        self._num_dealt = 0
         self.add_decks()
 
+    @classmethod
+    def restore(cls, num_decks, cards, discards=b'', num_dealt=0, shuffle=None,
+                rng=None):
+        """Recreates a shoe from the state returned by snapshot(), without
+        shuffling it.
+
+        Args:
+            num_decks: int, number of decks on the shoe.
+            cards: bytes, card codes left on the shoe.
+            discards: bytes, card codes waiting to be put back by a continuous
+                shuffle. Optional.
+            num_dealt: int, number of cards drawn from the shoe. Optional.
+            shuffle: shuffle model from shuffles. Optional, defaults to a
+                perfect shuffle.
+            rng: random number generator. Optional, defaults to the random
+                module.
+
+        Returns:
+            Shoe, the restored shoe.
+        """
+        shoe = cls.__new__(cls)
+        shoe._num_decks = num_decks
+        shoe._shuffle = shuffle if shuffle else PerfectShuffle()
+        shoe._rng = rng if rng else random
+        shoe._cards = bytearray(cards)
+        shoe._discards = bytearray(discards)
+        shoe._num_dealt = num_dealt
+        return shoe
+
     @property
     def num_decks(self):
         """Returns initial number of decks of shoe."""
@@ -99,25 +151,59 @@ class Shoe:
         """Returns current number of cards in shoe."""
         return len(self._cards)
 
+    @property
+    def num_dealt(self):
+        """Returns the number of cards drawn from the shoe."""
+        return self._num_dealt
+
     @property
     def cards(self):
         """Returns current list of cards in shoe."""
-        return self._cards
+        return [DECK[code] for code in self._cards]
+
+    @property
+    def shuffle(self):
+        """Returns the shuffle model of the shoe."""
+        return self._shuffle
+
+    @property
+    def composition(self):
+        """Returns a list with the number of cards left in shoe for each
+        baccarat value, from 0 to 9.
+        """
+        counts = [0] * 10
+        for code in range(len(DECK)):
+            counts[VALUES[code]] += self._cards.count(code)
+        return counts
+
+    def snapshot(self):
+        """Returns the state of the shoe.
+
+        Returns:
+            tuple, with the card codes left and the discards waiting to be put
+                back as bytes, the number of cards dealt and the state of the
+                random number generator, None if it cannot be saved.
+        """
+        try:
+            rng_state = self._rng.getstate()
+        except (AttributeError, NotImplementedError):
+            rng_state = None
+        return bytes(self._cards), bytes(self._discards), self._num_dealt, rng_state
 
     def add_decks(self, num_decks=None):
-        """Refils the shoe with decks. Uses self.num_decks value if empty."""
+        """Refils the shoe with decks. Uses self.num_decks value if empty.
+        New decks come in deck order and the whole shoe is shuffled with the
+        shuffle model.
+        """
         if not num_decks:
             num_decks = self._num_decks
-
-        for i in range(num_decks):
-            for suit in SUITS:
-                for rank in RANKS:
-                   self._cards.append(Card(rank, suit)) 
-        random.shuffle(self._cards)
+        self._cards.extend(bytes(range(len(DECK))) * num_decks)
+        self._shuffle(self._cards, self._rng)
 
     def draw_cards(self, num_cards):
         """Draws cards from shoe. Refills the shoe when
-        it is empty.
+        it is empty. With a continuous shuffle model the drawn cards are
+        put back once a batch of them was dealt.
 
         Args:
             num_cards: int, number of cards to be drawn.
@@ -129,14 +215,21 @@ class Shoe:
         for i in range(num_cards):
             if len(self._cards) == 0:
                 self.add_decks()
-            cards_drawn.append(self._cards.pop())
+            code = self._cards.pop()
+            cards_drawn.append(DECK[code])
+            if self._shuffle.continuous:
+                self._discards.append(code)
+        self._num_dealt += num_cards
+        if self._shuffle.continuous and len(self._discards) >= self._shuffle.batch:
+            self._shuffle.reinsert(self._cards, self._discards, self._rng)
+            self._discards.clear()
         return cards_drawn
 
     def __repr__(self):
         """Return the representation string as if the object was
         called when creating a new instance.
         """
-        return f'Shoe({self._num_decks})'
+        return f'Shoe({self._num_decks}, {self._shuffle!r})'
 
     def __str__(self):
         """Returns a string with the number of decks and the
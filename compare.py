@@ -0,0 +1,331 @@
+import argparse
+import math
+import random
+from cards import DECK, Shoe, VALUES
+from rules import Game
+from edge import OUTCOMES, house_edges
+from shuffles import PerfectShuffle
+
+Z_95 = 1.959964
+COUP_CARDS = 6
+# Card codes of a deck ordered by card value
+_BY_VALUE = sorted(range(len(DECK)), key=VALUES.__getitem__)
+
+class CoupledShoe(Shoe):
+    """Shoe that draws its cards with given uniform random numbers. Each coup
+    takes a block of COUP_CARDS numbers, and each number picks a card among
+    the ones left ordered by value, every card with the same probability.
+    Shoes fed the same numbers then deal mostly the same card values on the
+    same coups whatever their number of decks, and each one is still dealt
+    uniformly at random.
+
+    Args:
+        num_decks: int, number of decks on the shoe.
+        uniforms: list, floats from 0 to 1, COUP_CARDS for every coup.
+    """
+    def __init__(self, num_decks, uniforms):
+        # Built in value order, there is nothing to shuffle
+        self._num_decks = num_decks
+        self._shuffle = PerfectShuffle()
+        self._rng = random
+        self._cards = bytearray(code for code in _BY_VALUE for deck in range(num_decks))
+        self._discards = bytearray()
+        self._num_dealt = 0
+        self._uniforms = uniforms
+        self._coup = 0
+        self._next = 0
+
+    def next_coup(self):
+        """Moves to the block of numbers of the next coup."""
+        self._next = self._coup * COUP_CARDS
+        self._coup += 1
+
+    def draw_cards(self, num_cards):
+        """Draws cards with the next numbers of the coup."""
+        cards_drawn = []
+        for i in range(num_cards):
+            left = len(self._cards)
+            position = min(int(self._uniforms[self._next] * left), left - 1)
+            self._next += 1
+            cards_drawn.append(DECK[self._cards.pop(position)])
+        self._num_dealt += num_cards
+        return cards_drawn
+
+class CoupledGame(Game):
+    """Game dealt from a CoupledShoe."""
+    def create_shoe(self, num_decks, uniforms=None):
+        """Creates a CoupledShoe when given the uniform random numbers, a
+        perfectly shuffled Shoe otherwise.
+        """
+        if uniforms is None:
+            Game.create_shoe(self, num_decks)
+        else:
+            self._shoe = CoupledShoe(num_decks, uniforms)
+            self._num_decks = num_decks
+
+    def deal_hands(self):
+        """Deals both hands with the numbers of a new coup."""
+        self._shoe.next_coup()
+        Game.deal_hands(self)
+
+class Config:
+    """A rule and deck variant to compare.
+
+    Args:
+        decks: int, number of decks per shoe. Optional, default value 8.
+        cut: int, a shoe ends when less than cut cards are left. Optional,
+            default value 6, as baccarat-sim.py.
+        commission: float, commission taken from banco wins. Optional,
+            default value 0.05.
+        tie_pays: int, tie payout to one. Optional, default value 8.
+        push_on_tie: bool, if banco and punto bets are returned on a tie.
+            Optional, default True.
+
+    Raises:
+        ValueError: If the cut card leaves less than one coup.
+    """
+    def __init__(self, decks=8, cut=6, commission=0.05, tie_pays=8,
+                 push_on_tie=True):
+        if not 6 <= cut <= decks * 52:
+            raise ValueError('Cut must leave at least six cards to deal.')
+        self.decks = decks
+        self.cut = cut
+        self.commission = commission
+        self.tie_pays = tie_pays
+        self.push_on_tie = push_on_tie
+        self._game = None
+
+    @classmethod
+    def parse(cls, text):
+        """Creates a Config from a string such as 'decks=6,cut=14'."""
+        types = {'decks': int, 'cut': int, 'commission': float,
+                 'tie_pays': int, 'push_on_tie': lambda v: v.lower() in ('1', 'true', 'yes')}
+        options = {}
+        for option in text.split(','):
+            key, value = option.split('=')
+            if key not in types:
+                raise ValueError(f'Unknown option {key}.')
+            options[key] = types[key](value)
+        return cls(**options)
+
+    def play(self, uniforms):
+        """Plays a shoe drawn with the given uniform random numbers, as
+        CoupledShoe does.
+
+        Returns:
+            tuple, dict with the house take of each bet over the shoe, in
+                amounts bet, and the number of coups.
+        """
+        if self._game is None:
+            self._game = CoupledGame(self.decks)
+        game = self._game
+        game.create_shoe(self.decks, uniforms)
+        wins = {'banco': 0, 'punto': 0, 'tie': 0}
+        coups = 0
+        while game.num_cards >= self.cut:
+            game.deal_hands()
+            if not game.is_natural():
+                game.draw_thirds()
+            wins[game.game_result()] += 1
+            coups += 1
+        # Edges are linear on the outcome frequencies, on the outcome counts
+        # they give the take over the whole shoe
+        return house_edges(wins, self.commission, self.tie_pays,
+                           self.push_on_tie), coups
+
+    def __str__(self):
+        return (f'decks={self.decks},cut={self.cut},commission={self.commission},'
+                f'tie_pays={self.tie_pays},push_on_tie={self.push_on_tie}')
+
+class Estimate:
+    """Running mean and variance of a sample, with Welford's method."""
+    def __init__(self):
+        self._count = 0
+        self._mean = 0.0
+        self._squares = 0.0
+
+    def add(self, value):
+        """Adds a value to the sample."""
+        self._count += 1
+        delta = value - self._mean
+        self._mean += delta / self._count
+        self._squares += delta * (value - self._mean)
+
+    @property
+    def mean(self):
+        """Returns the sample mean."""
+        return self._mean
+
+    @property
+    def variance(self):
+        """Returns the sample variance."""
+        return self._squares / (self._count - 1) if self._count > 1 else 0.0
+
+    @property
+    def interval(self):
+        """Returns the half width of the 95% confidence interval of the mean."""
+        return Z_95 * math.sqrt(self.variance / self._count) if self._count else 0.0
+
+class RatioEstimate:
+    """Ratio of the sums of a value and a weight over a sample of shoes,
+    such as the house take over the coups dealt, so that every coup counts
+    the same whatever the length of its shoe. The variance is the one of
+    the linearized ratio estimator.
+    """
+    def __init__(self):
+        self._values = []
+        self._weights = []
+
+    def add(self, value, weight):
+        """Adds the value and weight of a shoe to the sample."""
+        self._values.append(value)
+        self._weights.append(weight)
+
+    @property
+    def count(self):
+        """Returns the number of shoes."""
+        return len(self._values)
+
+    @property
+    def mean(self):
+        """Returns the ratio of the sums."""
+        weight = sum(self._weights)
+        return sum(self._values) / weight if weight else 0.0
+
+    def residuals(self):
+        """Returns the contribution of each shoe to the error of the ratio,
+        as a list with mean zero.
+        """
+        if not self._values:
+            return []
+        ratio = self.mean
+        mean_weight = sum(self._weights) / len(self._weights)
+        return [(value - ratio * weight) / mean_weight
+                for value, weight in zip(self._values, self._weights)]
+
+    @property
+    def variance(self):
+        """Returns the sample variance of the residuals."""
+        return _variance(self.residuals())
+
+    @property
+    def interval(self):
+        """Returns the half width of the 95% confidence interval of the ratio."""
+        return _interval(self.variance, self.count)
+
+class RatioDifference:
+    """Paired difference of two ratio estimates over the same shoes.
+
+    Args:
+        ratio: RatioEstimate, of a variant.
+        baseline: RatioEstimate, of the baseline on the same shoes.
+    """
+    def __init__(self, ratio, baseline):
+        self._mean = ratio.mean - baseline.mean
+        self._count = ratio.count
+        self._variance = _variance([residual - base for residual, base in
+                                    zip(ratio.residuals(), baseline.residuals())])
+
+    @property
+    def mean(self):
+        """Returns the difference of the ratios."""
+        return self._mean
+
+    @property
+    def variance(self):
+        """Returns the sample variance of the paired residuals."""
+        return self._variance
+
+    @property
+    def interval(self):
+        """Returns the half width of the 95% confidence interval of the
+        difference.
+        """
+        return _interval(self._variance, self._count)
+
+def _variance(residuals):
+    """Returns the sample variance of residuals with mean zero."""
+    if len(residuals) < 2:
+        return 0.0
+    return sum(residual * residual for residual in residuals) / (len(residuals) - 1)
+
+def _interval(variance, count):
+    """Returns the half width of a 95% confidence interval of a mean."""
+    return Z_95 * math.sqrt(variance / count) if count else 0.0
+
+def common_numbers(decks, shoes, seed=None):
+    """Generates the uniform random numbers of the shoes shared by all
+    configurations, enough for the coups of the largest shoe.
+
+    Args:
+        decks: list, number of decks of each configuration.
+        shoes: int, number of shoes.
+        seed: int, seed of the numbers. Optional.
+
+    Yields:
+        list, with the numbers of a shoe.
+    """
+    rng = random.Random(seed)
+    size = (max(decks) * 52 // 4 + 1) * COUP_CARDS
+    for i in range(shoes):
+        yield [rng.random() for j in range(size)]
+
+def compare(configs, shoes, seed=None):
+    """Plays every configuration on common shoes, drawn with the same
+    random numbers so that the coups stay aligned across deck counts.
+
+    Args:
+        configs: list, Config objects. The first one is the baseline.
+        shoes: int, number of shoes.
+        seed: int, seed of the shuffles. Optional.
+
+    Returns:
+        tuple, a list with a RatioEstimate of the edge of each bet for every
+            configuration, the house take over the coups dealt, and a list
+            with a RatioDifference to the baseline.
+    """
+    edges = [{outcome: RatioEstimate() for outcome in OUTCOMES} for config in configs]
+    decks = [config.decks for config in configs]
+    for uniforms in common_numbers(decks, shoes, seed):
+        for i, config in enumerate(configs):
+            takes, coups = config.play(uniforms)
+            for outcome in OUTCOMES:
+                edges[i][outcome].add(takes[outcome], coups)
+    differences = [{outcome: RatioDifference(edges[i][outcome], edges[0][outcome])
+                    for outcome in OUTCOMES} for i in range(len(configs))]
+    return edges, differences
+
+def main():
+
+    # Argument parser
+    parser = argparse.ArgumentParser(description='Compares rule and deck variants '
+                                     'on common shoes.')
+    parser.add_argument('-c', action='append', dest='configs', type=Config.parse,
+                        metavar='CONFIG', help='variant such as decks=6,cut=14,'
+                        'commission=0.05,tie_pays=8,push_on_tie=true. The first '
+                        'one is the baseline')
+    parser.add_argument('-s', action='store', dest='shoes', default=1000,
+                        type=int, help='number of shoes, default 1000')
+    parser.add_argument('--seed', action='store', dest='seed', default=None,
+                        type=int, help='seed of the shuffles')
+    args = parser.parse_args()
+    configs = args.configs or [Config(8), Config(6)]
+
+    edges, differences = compare(configs, args.shoes, args.seed)
+    for i, config in enumerate(configs):
+        print(f'\n{"Baseline" if i == 0 else "Variant"}: {config}')
+        for outcome in OUTCOMES:
+            edge = edges[i][outcome]
+            line = f'{outcome.title()}:\t{edge.mean * 100:.4f}% ± {edge.interval * 100:.4f}%'
+            if i:
+                difference = differences[i][outcome]
+                line += (f'\tdifference {difference.mean * 100:+.4f}% ± '
+                         f'{difference.interval * 100:.4f}%')
+                if difference.variance:
+                    independent = edge.variance + edges[0][outcome].variance
+                    line += (f' (variance {independent / difference.variance:.1f}x '
+                             'lower than independent runs)')
+            print(line)
+
+if __name__ == '__main__':
+    main()
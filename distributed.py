@@ -0,0 +1,281 @@
+import io
+import json
+import os
+import shutil
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+from collections import deque
+from multiprocessing import Process
+from analytics import DepthProfile
+from simulation import play_shoes, write_totals
+
+# Times each local worker is started again after exiting before the end
+RESTARTS = 3
+
+def send(stream, message):
+    """Writes a message as one line of JSON."""
+    stream.write(json.dumps(message).encode() + b'\n')
+    stream.flush()
+
+def receive(stream):
+    """Reads a message written by send(). Returns None on a closed stream."""
+    line = stream.readline()
+    return json.loads(line) if line else None
+
+class Coordinator:
+    """Hands out ranges of shoes of a seeded simulation to workers and joins
+    their results. A range leased to a worker that disconnects or does not
+    answer in time is handed out again. As every shoe has its own seed the
+    joined output is the same as a single process run.
+
+    Args:
+        params: dict, with the decks, shoes, seed and shuffle of the simulation,
+            and optionally the depth_bin of a depth profile.
+        part: int, number of shoes per range. Optional, default value 100.
+        lease: float, seconds a worker has to return a range. Optional,
+            default value 600.
+
+    Attributes:
+        finished: bool, if all the ranges were returned.
+        total_wins: dict, with the total wins of each hand.
+        game_count: int, number of coups played.
+        depth: DepthProfile, joined depth profile of the workers, or None.
+    """
+    def __init__(self, params, part=100, lease=600):
+        self._params = params
+        self._lease = lease
+        self._pending = deque((start, min(start + part, params['shoes']))
+                              for start in range(0, params['shoes'], part))
+        self._num_ranges = len(self._pending)
+        self._leases = {}
+        self._results = {}
+        self._parts_dir = tempfile.mkdtemp(prefix='baccarat-')
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self.total_wins = {'banco': 0, 'punto': 0, 'tie': 0}
+        self.game_count = 0
+        self.depth = None
+        if params.get('depth_bin'):
+            self.depth = DepthProfile(params['decks'] * 52, params['depth_bin'])
+
+    @property
+    def finished(self):
+        """Returns if all the ranges were returned."""
+        return self._done.is_set()
+
+    @property
+    def shoes_done(self):
+        """Returns the number of shoes returned by the workers."""
+        with self._lock:
+            return sum(stop - start for start, stop in self._results)
+
+    def lease(self, worker):
+        """Leases the next range to a worker, taking back expired leases first.
+
+        Returns:
+            tuple, start and stop of the range, or None if there is nothing
+                left to hand out right now.
+        """
+        with self._lock:
+            now = time.monotonic()
+            for shoes, (owner, deadline) in list(self._leases.items()):
+                if deadline < now:
+                    del self._leases[shoes]
+                    self._pending.appendleft(shoes)
+            if not self._pending:
+                return None
+            shoes = self._pending.popleft()
+            self._leases[shoes] = (worker, now + self._lease)
+            return shoes
+
+    def release(self, worker):
+        """Takes back the ranges leased to a worker that went away."""
+        with self._lock:
+            for shoes, (owner, deadline) in list(self._leases.items()):
+                if owner == worker:
+                    del self._leases[shoes]
+                    self._pending.appendleft(shoes)
+
+    def complete(self, start, stop, total_wins, game_count, output, depth=None):
+        """Records the result of a range. Late results of a range that was
+        handed out again are ignored.
+        """
+        shoes = (start, stop)
+        with self._lock:
+            if shoes in self._results:
+                return
+            self._leases.pop(shoes, None)
+            if shoes in self._pending:
+                self._pending.remove(shoes)
+            part_name = os.path.join(self._parts_dir, f'{start}.txt')
+            with open(part_name, 'w') as part_file:
+                part_file.write(output)
+            self._results[shoes] = part_name
+            self.game_count += game_count
+            for win in total_wins:
+                self.total_wins[win] += total_wins[win]
+            if self.depth is not None:
+                self.depth.merge(DepthProfile.from_dict(depth))
+            if len(self._results) == self._num_ranges:
+                self._done.set()
+
+    def wait(self, timeout=None):
+        """Waits until all the ranges were returned."""
+        return self._done.wait(timeout)
+
+    def write(self, sim_file):
+        """Writes the joined output and total results of the simulation."""
+        for shoes in sorted(self._results):
+            with open(self._results[shoes]) as part_file:
+                shutil.copyfileobj(part_file, sim_file)
+        write_totals(sim_file, self.total_wins, self.game_count)
+        self.discard()
+
+    def discard(self):
+        """Removes the outputs of the returned ranges."""
+        shutil.rmtree(self._parts_dir, ignore_errors=True)
+
+class WorkerHandler(socketserver.StreamRequestHandler):
+    """Serves a worker connection: leases ranges and receives their results
+    until the simulation is finished or the worker goes away.
+    """
+    def handle(self):
+        coordinator = self.server.coordinator
+        worker = self.client_address
+        try:
+            while receive(self.rfile) is not None:
+                if coordinator.finished:
+                    send(self.wfile, {'type': 'done'})
+                    return
+                shoes = coordinator.lease(worker)
+                if shoes is None:
+                    send(self.wfile, {'type': 'wait'})
+                    continue
+                send(self.wfile, {'type': 'work', 'params': self.server.params,
+                                  'start': shoes[0], 'stop': shoes[1]})
+                result = receive(self.rfile)
+                if result is None:
+                    return
+                coordinator.complete(result['start'], result['stop'],
+                                     result['total_wins'], result['game_count'],
+                                     result['output'], result.get('depth'))
+        except (OSError, ValueError):
+            pass
+        finally:
+            coordinator.release(worker)
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+    """TCP server of a Coordinator."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, params, part=100, lease=600):
+        socketserver.ThreadingTCPServer.__init__(self, address, WorkerHandler)
+        self.params = params
+        self.coordinator = Coordinator(params, part, lease)
+
+def coordinate(sim_file, params, port, part=100, lease=600, progress=None,
+               local_workers=0):
+    """Runs a coordinator until the workers played all the shoes and writes
+    the results.
+
+    Args:
+        sim_file: file object, where the results are written.
+        params: dict, with the decks, shoes, seed and shuffle of the simulation,
+            and optionally the depth_bin of a depth profile.
+        port: int, port to listen on. 0 picks a free one.
+        part: int, number of shoes per range. Optional, default value 100.
+        lease: float, seconds a worker has to return a range. Optional,
+            default value 600.
+        progress: callable, called with the number of shoes done. Optional.
+        local_workers: int, number of worker processes to start on this
+            machine. Optional. A worker that exits before the end is started
+            again, up to RESTARTS restarts per worker shared by all of them.
+
+    Returns:
+        tuple, dict with the total wins of each hand, the number of coups and
+            the joined depth profile or None.
+
+    Raises:
+        RuntimeError: If all the local workers exited and cannot be started
+            again.
+    """
+    server = CoordinatorServer(('', port), params, part, lease)
+    coordinator = server.coordinator
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    address = ('127.0.0.1', server.server_address[1])
+    workers = [Process(target=work, args=address) for i in range(local_workers)]
+    restarts = RESTARTS * local_workers
+    for process in workers:
+        process.start()
+    try:
+        while not coordinator.wait(0.5):
+            # The ranges of a worker that exited were taken back on disconnect
+            for i, process in enumerate(workers):
+                if process.exitcode is not None and restarts and not coordinator.finished:
+                    restarts -= 1
+                    process.join()
+                    workers[i] = Process(target=work, args=address)
+                    workers[i].start()
+            if workers and all(process.exitcode is not None for process in workers) \
+                    and not coordinator.finished:
+                codes = [process.exitcode for process in workers]
+                raise RuntimeError(f'Local workers exited with codes {codes}.')
+            if progress is not None:
+                progress(coordinator.shoes_done)
+        if progress is not None:
+            progress(coordinator.shoes_done)
+    except BaseException:
+        coordinator.discard()
+        raise
+    finally:
+        server.shutdown()
+        server.server_close()
+        for process in workers:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+    coordinator.write(sim_file)
+    return coordinator.total_wins, coordinator.game_count, coordinator.depth
+
+def work(host, port, retry=1.0):
+    """Runs a worker: plays the ranges handed out by a coordinator until it
+    is done or goes away.
+    """
+    try:
+        connection = socket.create_connection((host, port))
+    except OSError:
+        return
+    with connection, connection.makefile('rwb') as stream:
+        while True:
+            try:
+                send(stream, {'type': 'ready'})
+                message = receive(stream)
+            except OSError:
+                return
+            if message is None or message['type'] == 'done':
+                return
+            if message['type'] == 'wait':
+                time.sleep(retry)
+                continue
+            params = message['params']
+            output = io.StringIO()
+            depth = None
+            if params.get('depth_bin'):
+                depth = DepthProfile(params['decks'] * 52, params['depth_bin'])
+            total_wins, game_count = play_shoes(
+                output, params['decks'], message['start'], message['stop'],
+                params['shuffle'], params['seed'], depth=depth)
+            result = {'type': 'result', 'start': message['start'],
+                      'stop': message['stop'], 'total_wins': total_wins,
+                      'game_count': game_count, 'output': output.getvalue()}
+            if depth is not None:
+                result['depth'] = depth.to_dict()
+            try:
+                send(stream, result)
+            except OSError:
+                return
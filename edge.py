@@ -0,0 +1,210 @@
+import argparse
+from fractions import Fraction
+from multiprocessing import Pool
+from cards import Card, Shoe
+from hands import Punto, Banco
+
+OUTCOMES = ['banco', 'punto', 'tie']
+
+def value_card(value):
+    """Returns a Card with the given baccarat value."""
+    if value == 0:
+        return Card(10, 'spades')
+    elif value == 1:
+        return Card('ace', 'spades')
+    return Card(value, 'spades')
+
+def two_cards(total):
+    """Returns two cards adding up to the given hand total."""
+    return [value_card(total), value_card(0)]
+
+def draw_tables(punto_class=Punto, banco_class=Banco):
+    """Builds the third card decisions from the hand classes, so rule
+    variants only need to subclass Punto or Banco.
+
+    Returns:
+        tuple, a list with the punto decision for each two card total and a
+            list with the banco decisions for each two card total. Each banco
+            entry is a list with the decision for every punto third card
+            value, followed by the decision when punto stands.
+    """
+    punto_draws = [punto_class(two_cards(total)).draw_third()
+                   for total in range(10)]
+    banco_draws = []
+    for total in range(10):
+        hand = banco_class(two_cards(total))
+        decisions = [hand.draw_third(value_card(value)) for value in range(10)]
+        decisions.append(hand.draw_third())
+        banco_draws.append(decisions)
+    return punto_draws, banco_draws
+
+def _enumerate_first(task):
+    """Enumerates all the coups whose first punto card has the given value.
+
+    Every coup is weighted by the number of ordered card sequences dealing it,
+    scaled to six cards drawn so that all the weights share one denominator.
+
+    Returns:
+        list, weights of banco, punto and tie outcomes.
+    """
+    first, counts, punto_draws, banco_draws = task
+    counts = list(counts)
+    left = sum(counts)
+    weights = [0, 0, 0]
+    if not counts[first]:
+        return weights
+
+    def outcome(punto, banco):
+        return 0 if banco > punto else 1 if punto > banco else 2
+
+    weight_1 = counts[first]
+    counts[first] -= 1
+    for second in range(10):
+        if not counts[second]:
+            continue
+        weight_2 = weight_1 * counts[second]
+        counts[second] -= 1
+        for third in range(10):
+            if not counts[third]:
+                continue
+            weight_3 = weight_2 * counts[third]
+            counts[third] -= 1
+            for fourth in range(10):
+                if not counts[fourth]:
+                    continue
+                weight_4 = weight_3 * counts[fourth]
+                counts[fourth] -= 1
+                punto = (first + second) % 10
+                banco = (third + fourth) % 10
+
+                if punto >= 8 or banco >= 8:
+                    weights[outcome(punto, banco)] += \
+                        weight_4 * (left - 4) * (left - 5)
+                elif punto_draws[punto]:
+                    for punto_third in range(10):
+                        if not counts[punto_third]:
+                            continue
+                        weight_5 = weight_4 * counts[punto_third]
+                        punto_total = (punto + punto_third) % 10
+                        if banco_draws[banco][punto_third]:
+                            counts[punto_third] -= 1
+                            for banco_third in range(10):
+                                if counts[banco_third]:
+                                    weights[outcome(punto_total,
+                                                    (banco + banco_third) % 10)] \
+                                        += weight_5 * counts[banco_third]
+                            counts[punto_third] += 1
+                        else:
+                            weights[outcome(punto_total, banco)] += \
+                                weight_5 * (left - 5)
+                elif banco_draws[banco][10]:
+                    for banco_third in range(10):
+                        if counts[banco_third]:
+                            weights[outcome(punto, (banco + banco_third) % 10)] \
+                                += weight_4 * counts[banco_third] * (left - 5)
+                else:
+                    weights[outcome(punto, banco)] += \
+                        weight_4 * (left - 4) * (left - 5)
+                counts[fourth] += 1
+            counts[third] += 1
+        counts[second] += 1
+    return weights
+
+def outcome_probabilities(composition, punto_class=Punto, banco_class=Banco,
+                          processes=None):
+    """Computes the exact outcome probabilities of the next coup dealt from a
+    shoe. Enumerates card values with their multiplicities instead of
+    individual cards and splits the work by the first punto card across
+    processes.
+
+    Args:
+        composition: list, number of cards for each value from 0 to 9, as
+            returned by Shoe.composition.
+        punto_class: Punto subclass with the punto third card rule.
+        banco_class: Banco subclass with the banco third card rule.
+        processes: int, number of worker processes. Optional, defaults to
+            the number of CPUs. With 1 no processes are started.
+
+    Returns:
+        dict, with the exact Fraction probability of each outcome.
+
+    Raises:
+        ValueError: If the composition has less than six cards.
+    """
+    if len(composition) != 10:
+        raise ValueError('Composition must have ten card values.')
+    left = sum(composition)
+    if left < 6:
+        raise ValueError('Composition must have at least six cards.')
+    punto_draws, banco_draws = draw_tables(punto_class, banco_class)
+    tasks = [(first, tuple(composition), punto_draws, banco_draws)
+             for first in range(10)]
+    if processes == 1:
+        partials = map(_enumerate_first, tasks)
+    else:
+        with Pool(processes) as pool:
+            partials = pool.map(_enumerate_first, tasks)
+    weights = [0, 0, 0]
+    for partial in partials:
+        for i in range(3):
+            weights[i] += partial[i]
+    sequences = 1
+    for i in range(6):
+        sequences *= left - i
+    return {outcome: Fraction(weights[i], sequences)
+            for i, outcome in enumerate(OUTCOMES)}
+
+def house_edges(probabilities, commission=Fraction(5, 100), tie_pays=8,
+                push_on_tie=True):
+    """Computes the house edge of each bet from the outcome probabilities.
+
+    Args:
+        probabilities: dict, probability of each outcome.
+        commission: Fraction, commission taken from banco wins.
+        tie_pays: int, tie payout to one.
+        push_on_tie: bool, if banco and punto bets are returned on a tie.
+            Table settles them as lost, use False to match it.
+
+    Returns:
+        dict, with the house edge of each bet as a fraction of the amount bet.
+    """
+    banco = probabilities['banco']
+    punto = probabilities['punto']
+    tie = probabilities['tie']
+    lost_on_tie = 0 if push_on_tie else tie
+    return {'banco': -(banco * (1 - commission) - punto - lost_on_tie),
+            'punto': -(punto - banco - lost_on_tie),
+            'tie': -(tie * tie_pays - banco - punto)}
+
+def main():
+
+    # Argument parser
+    parser = argparse.ArgumentParser(description='Computes exact baccarat '
+                                     'probabilities and house edges.')
+    parser.add_argument('-d', action='store', dest='decks', default=8,
+                        type=int, help='number of decks per shoe, default 8')
+    parser.add_argument('-c', action='store', dest='commission', default='0.05',
+                        help='banco commission, default 0.05')
+    parser.add_argument('-t', action='store', dest='tie_pays', default=8,
+                        type=int, help='tie payout to one, default 8')
+    parser.add_argument('-p', action='store', dest='processes', default=None,
+                        type=int, help='number of processes, default one per CPU')
+    parser.add_argument('--lose-on-tie', action='store_true',
+                        help='settle banco and punto bets as lost on a tie')
+    args = parser.parse_args()
+
+    probabilities = outcome_probabilities(Shoe(args.decks).composition,
+                                          processes=args.processes)
+    edges = house_edges(probabilities, Fraction(args.commission), args.tie_pays,
+                        not args.lose_on_tie)
+
+    print(f'{args.decks} decks shoe.')
+    for outcome in OUTCOMES:
+        probability = probabilities[outcome]
+        print(f'{outcome.title()}:\t{float(probability):.8f}\t{probability}')
+    print('\nHouse edge:')
+    for outcome in OUTCOMES:
+        print(f'{outcome.title()}:\t{float(edges[outcome]) * 100:.4f}%')
+
+if __name__ == '__main__':
+    main()
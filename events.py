@@ -0,0 +1,115 @@
+from collections import namedtuple
+
+EVENTS = ['coup_dealt', 'third_card', 'result', 'bet_settled']
+
+Event = namedtuple('Event', ['name', 'coup', 'data'])
+Event.__doc__ = """Event emitted by a Game or Table.
+
+The data of each event is a tuple:
+    coup_dealt: punto cards and banco cards.
+    third_card: hand, punto or banco, and the card drawn.
+    result: outcome, punto value, banco value and if it was a natural.
+    bet_settled: player index, hand bet, amount bet, win or lose and the
+        new balance.
+"""
+
+class Subscription:
+    """A subscriber of a Dispatcher. Events are buffered and handed to the
+    callback in lists of batch events.
+
+    Args:
+        callback: callable, receives a list of Event.
+        events: iterable, names of the events to receive. Optional,
+            defaults to all events.
+        batch: int, number of events per call. Optional, default value 1.
+
+    Raises:
+        ValueError: On an unknown event name or a batch that is not positive.
+    """
+    def __init__(self, callback, events=None, batch=1):
+        events = EVENTS if events is None else list(events)
+        for name in events:
+            if name not in EVENTS:
+                raise ValueError(f'Unknown event {name}.')
+        if batch < 1:
+            raise ValueError('Batch must be positive.')
+        self._callback = callback
+        self._events = events
+        self._batch = batch
+        self._buffer = []
+
+    @property
+    def events(self):
+        """Returns the names of the subscribed events."""
+        return self._events
+
+    @property
+    def batch(self):
+        """Returns the number of events per call."""
+        return self._batch
+
+    def deliver(self, event):
+        """Buffers an event and calls back when the batch is full."""
+        self._buffer.append(event)
+        if len(self._buffer) >= self._batch:
+            self.flush()
+
+    def flush(self):
+        """Calls back with the buffered events, if any."""
+        if self._buffer:
+            events, self._buffer = self._buffer, []
+            self._callback(events)
+
+    def __repr__(self):
+        return f'Subscription({self._callback!r}, {self._events}, {self._batch})'
+
+class Dispatcher:
+    """Delivers events to the subscriptions of each event name. Games only
+    create a dispatcher on the first subscription, so play without
+    subscribers does not build any event.
+    """
+    def __init__(self):
+        self._subscriptions = {name: [] for name in EVENTS}
+
+    @property
+    def subscriptions(self):
+        """Returns the list of distinct subscriptions."""
+        subscriptions = []
+        for name in EVENTS:
+            for subscription in self._subscriptions[name]:
+                if subscription not in subscriptions:
+                    subscriptions.append(subscription)
+        return subscriptions
+
+    def subscribe(self, subscription):
+        """Adds a subscription to its event names."""
+        for name in subscription.events:
+            self._subscriptions[name].append(subscription)
+
+    def unsubscribe(self, subscription):
+        """Flushes and removes a subscription.
+
+        Raises:
+            ValueError: If the subscription is not subscribed.
+        """
+        if subscription not in self.subscriptions:
+            raise ValueError('Not subscribed.')
+        subscription.flush()
+        for name in subscription.events:
+            self._subscriptions[name].remove(subscription)
+
+    def emit(self, name, coup, data):
+        """Delivers an event to the subscriptions of its name."""
+        subscriptions = self._subscriptions[name]
+        if subscriptions:
+            event = Event(name, coup, data)
+            for subscription in subscriptions:
+                subscription.deliver(event)
+
+    def flush(self):
+        """Delivers the buffered events of all subscriptions."""
+        for subscription in self.subscriptions:
+            subscription.flush()
+
+    def __len__(self):
+        return len(self.subscriptions)
@@ -84,7 +84,17 @@ class Punto(Hand):
 class Banco(Hand):
     """Banker(banco) hand of baccarat. Adds the third card check for
     the banker. Subclass of Hand.
+
+    Attributes:
+        third_card_rules: dict, for each banco value from 3 to 6 the punto
+            third card values on which banco draws. Override it on a subclass
+            for rule variants.
     """
+    third_card_rules = {3: [0, 1, 2, 3, 4, 5, 6, 7, 9],
+                        4: [2, 3, 4, 5, 6, 7],
+                        5: [4, 5, 6, 7],
+                        6: [6, 7]}
+
     def __init__(self, cards):
         Hand.__init__(self, cards)
 
@@ -98,11 +108,6 @@ class Banco(Hand):
             bol, True if there is need to a third card draw,
                 False otherwise.
         """
-        third_card_rules = {3: [0, 1, 2, 3, 4, 5, 6, 7, 9],
-                            4: [2, 3, 4, 5, 6, 7],
-                            5: [4, 5, 6, 7],
-                            6: [6, 7]}
-
         if len(self._cards) == 2:
             if player_third:
                 if not isinstance(player_third, Card):
@@ -110,7 +115,7 @@ class Banco(Hand):
                 if 0 <= self.value <= 2:
                     return True
                 elif 3 <= self.value <= 6:
-                    if player_third.value in third_card_rules[self.value]:
+                    if player_third.value in self.third_card_rules[self.value]:
                         return True
             else:
                 if 0 <= self.value <= 5:
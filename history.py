@@ -0,0 +1,533 @@
+import argparse
+import bisect
+import os
+import struct
+from array import array
+
+OUTCOMES = ['banco', 'punto', 'tie']
+HANDS = ['banco', 'punto']
+NO_CARD = 10
+_MAGIC = b'BCHIST2\n'
+_COLUMNS = ['outcome', 'banco_value', 'punto_value', 'shoe', 'cards_left',
+            'run_outcome', 'run_length']
+# Index keys on file, each followed by the number of coups and the coups
+_INDEX_KEYS = {'run_index': struct.Struct('<bH'),
+               'position_index': struct.Struct('<H'),
+               'card_index': struct.Struct('<BB')}
+# First coup and number of coups of a segment, and its offset on the
+# directory at the end of the file
+_SEGMENT = struct.Struct('<QQ')
+_DIRECTORY = struct.Struct('<QQQ')
+# Shoe, outcome, run outcome and run length of the last coup
+_LAST = struct.Struct('<qbbH')
+# Run outcome, run length and cards left of a counters entry
+_COUNTS_KEY = struct.Struct('<bHH')
+_COUNT = struct.Struct('<Q')
+# Counters per outcome of all the coups of a counters entry, followed by the
+# ones of the coups with each card value on banco and on punto hand
+_CARD_SLOTS = 1 + len(HANDS) * NO_CARD
+
+class _Segment:
+    """Columns and indexes of a range of consecutive coups. Index entries
+    hold the sorted coups of each key.
+    """
+    def __init__(self, first):
+        self.first = first
+        self.outcome = array('b')
+        self.banco_value = array('b')
+        self.punto_value = array('b')
+        self.shoe = array('I')
+        self.cards_left = array('H')
+        self.run_outcome = array('b')
+        self.run_length = array('H')
+        self.cards = bytearray()
+        self.run_index = {}
+        self.position_index = {}
+        self.card_index = {}
+
+    def write(self, history_file):
+        """Writes the segment to a binary file."""
+        history_file.write(_SEGMENT.pack(self.first, len(self)))
+        for column in _COLUMNS:
+            getattr(self, column).tofile(history_file)
+        history_file.write(self.cards)
+        for name, layout in _INDEX_KEYS.items():
+            index = getattr(self, name)
+            history_file.write(_COUNT.pack(len(index)))
+            for key, coups in index.items():
+                history_file.write(layout.pack(*key) + _COUNT.pack(len(coups)))
+                coups.tofile(history_file)
+
+    @classmethod
+    def read(cls, history_file):
+        """Reads a segment written by write(), in bulk."""
+        first, num_coups = _SEGMENT.unpack(history_file.read(_SEGMENT.size))
+        segment = cls(first)
+        for column in _COLUMNS:
+            getattr(segment, column).fromfile(history_file, num_coups)
+        segment.cards = bytearray(history_file.read(num_coups * 6))
+        for name, layout in _INDEX_KEYS.items():
+            index = getattr(segment, name)
+            num_keys, = _COUNT.unpack(history_file.read(_COUNT.size))
+            for i in range(num_keys):
+                key = layout.unpack(history_file.read(layout.size))
+                num_entries, = _COUNT.unpack(history_file.read(_COUNT.size))
+                coups = index[key] = array('I')
+                coups.fromfile(history_file, num_entries)
+        return segment
+
+    def select(self, run, cards_left, card):
+        """Returns the sorted coups of the segment matching the criteria, by
+        intersecting the index entries of each criterion.
+        """
+        groups = []
+        if run is not None:
+            hand, length = run
+            groups.append([coups for key, coups in self.run_index.items()
+                           if key[0] == hand and key[1] >= length])
+        if cards_left is not None:
+            low, high = cards_left
+            groups.append([coups for key, coups in self.position_index.items()
+                           if low <= key[0] <= high])
+        if card is not None:
+            groups.append([self.card_index.get(card, array('I'))])
+        if not groups:
+            return range(self.first, self.first + len(self))
+        merged = []
+        for group in groups:
+            coups = array('I')
+            for entry in group:
+                coups.extend(entry)
+            merged.append(coups)
+        merged.sort(key=len)
+        if len(merged) == 1:
+            return sorted(merged[0]) if len(groups[0]) > 1 else merged[0]
+        matches = set(merged[0])
+        for coups in merged[1:]:
+            matches.intersection_update(coups)
+        return sorted(matches)
+
+    def __len__(self):
+        return len(self.outcome)
+
+class CoupHistory:
+    """Columnar store of recorded coups with indexes on the preceding outcome
+    run, the shoe position and the card values of both hands.
+
+    The coups are kept in segments of consecutive coups, each with its own
+    indexes. With a file name, every finished segment is written to the file
+    while recording and only the current one stays in memory, so the history
+    can grow to hundreds of millions of coups. close() finishes the file, to
+    be read back with load(). Segments on file are read one at a time by
+    the queries.
+
+    Outcome counters are also kept for every combination of preceding run,
+    cards left and card value on each hand, so frequency queries never
+    touch the coups themselves, whatever the criteria. Selecting coups with
+    several criteria intersects the index entries of each criterion, segment
+    by segment.
+
+    Runs are counted inside a shoe: a run is the number of consecutive coups
+    with the same outcome right before a coup, a tie breaks a run.
+
+    Args:
+        file_name: str, binary file where the coups are written while
+            recording. Optional, without it the coups are kept in memory and
+            can be written with save().
+        segment_size: int, number of coups of each segment. Optional, default
+            value 1048576.
+
+    Attributes:
+        num_coups: int, number of recorded coups.
+        num_shoes: int, number of shoes with recorded coups.
+    """
+    def __init__(self, file_name=None, segment_size=1 << 20):
+        self._file_name = file_name
+        self._file = None
+        if file_name is not None:
+            self._file = open(file_name, 'wb')
+            self._file.write(_MAGIC)
+        self._segment_size = segment_size
+        self._segments = []
+        self._current = _Segment(0)
+        self._cached = None
+        self._counts = {}
+        self._num_coups = 0
+        self._num_shoes = 0
+        self._last = None
+
+    @property
+    def num_coups(self):
+        """Returns the number of recorded coups."""
+        return self._num_coups
+
+    @property
+    def num_shoes(self):
+        """Returns the number of shoes with recorded coups."""
+        return self._num_shoes
+
+    def append(self, shoe, cards_left, outcome, banco_values, punto_values):
+        """Records a coup and updates the indexes and counters.
+
+        Args:
+            shoe: int, sequential number of the shoe, starting at 0.
+            cards_left: int, cards in the shoe when the hands were dealt.
+            outcome: str, banco, punto or tie.
+            banco_values: list, card values of banco hand.
+            punto_values: list, card values of punto hand.
+
+        Raises:
+            ValueError: If the outcome is not valid or the shoe number
+                goes back.
+        """
+        if outcome not in OUTCOMES:
+            raise ValueError('Invalid outcome.')
+        if self._last is not None and shoe < self._last[0]:
+            raise ValueError('Coups must be recorded in shoe order.')
+        coup = self._num_coups
+        result = OUTCOMES.index(outcome)
+
+        # Preceding run within the shoe
+        if self._last is None or shoe != self._last[0]:
+            run_outcome, run_length = -1, 0
+        else:
+            last_shoe, run_outcome, last_run_outcome, last_run_length = self._last
+            run_length = last_run_length + 1 if run_outcome == last_run_outcome else 1
+        self._last = (shoe, result, run_outcome, run_length)
+
+        segment = self._current
+        segment.outcome.append(result)
+        segment.banco_value.append(sum(banco_values) % 10)
+        segment.punto_value.append(sum(punto_values) % 10)
+        for values in (banco_values, punto_values):
+            segment.cards.extend(values)
+            segment.cards.extend([NO_CARD] * (3 - len(values)))
+        segment.shoe.append(shoe)
+        segment.cards_left.append(cards_left)
+        segment.run_outcome.append(run_outcome)
+        segment.run_length.append(run_length)
+
+        key = (run_outcome, run_length, cards_left)
+        try:
+            counts = self._counts[key]
+        except KeyError:
+            counts = self._counts[key] = array('Q', bytes(24 * _CARD_SLOTS))
+        counts[result] += 1
+        self._index(segment.run_index, (run_outcome, run_length), coup)
+        self._index(segment.position_index, (cards_left,), coup)
+        for hand, values in enumerate((banco_values, punto_values)):
+            for value in set(values):
+                self._index(segment.card_index, (hand, value), coup)
+                counts[3 * (1 + hand * NO_CARD + value) + result] += 1
+
+        self._num_coups += 1
+        self._num_shoes = shoe + 1
+        if len(segment) >= self._segment_size:
+            self._finish_segment()
+
+    def record(self, game, shoe, cards_left):
+        """Records the last coup played on a Game instance.
+
+        Args:
+            game: Game object, with a finished coup.
+            shoe: int, sequential number of the shoe, starting at 0.
+            cards_left: int, cards in the shoe before the hands were dealt.
+        """
+        self.append(shoe, cards_left, game.game_result(),
+                    game.banco_values, game.punto_values)
+
+    @staticmethod
+    def _index(index, key, coup):
+        try:
+            index[key].append(coup)
+        except KeyError:
+            index[key] = array('I', [coup])
+
+    def _finish_segment(self):
+        """Starts a new segment, writing the current one to the file if the
+        history has one.
+        """
+        segment = self._current
+        if self._file is not None:
+            offset = self._file.tell()
+            segment.write(self._file)
+            self._file.flush()
+            self._segments.append((segment.first, len(segment), offset))
+        else:
+            self._segments.append((segment.first, len(segment), segment))
+        self._current = _Segment(self._num_coups)
+
+    def _segment(self, entry):
+        """Returns the segment of a directory entry, read from the file if
+        it is not in memory. The last segment read is kept.
+        """
+        first, num_coups, segment = entry
+        if isinstance(segment, _Segment):
+            return segment
+        if self._cached is None or self._cached.first != first:
+            with open(self._file_name, 'rb') as history_file:
+                history_file.seek(segment)
+                self._cached = _Segment.read(history_file)
+        return self._cached
+
+    def _all_segments(self):
+        """Yields the segments in coup order."""
+        for entry in self._segments:
+            yield self._segment(entry)
+        if len(self._current):
+            yield self._current
+
+    def _criteria(self, run, cards_left, card):
+        """Checks the query arguments and translates the outcomes and hands
+        into their codes.
+        """
+        if run is not None:
+            hand, length = run
+            if hand not in OUTCOMES:
+                raise ValueError('Invalid run outcome.')
+            run = (OUTCOMES.index(hand), length)
+        if card is not None:
+            hand, value = card
+            if hand not in HANDS:
+                raise ValueError('Invalid card hand.')
+            card = (HANDS.index(hand), value)
+        return run, cards_left, card
+
+    def select(self, run=None, cards_left=None, card=None):
+        """Selects the coups matching all the given criteria.
+
+        Args:
+            run: tuple, outcome and minimum length of the run right before
+                the coup, e.g. ('punto', 5).
+            cards_left: tuple, inclusive range of the cards left in the
+                shoe when the coup was dealt, e.g. (0, 20).
+            card: tuple, hand and card value present in that hand,
+                e.g. ('banco', 9).
+
+        Returns:
+            list, sorted indexes of the matching coups.
+        """
+        run, cards_left, card = self._criteria(run, cards_left, card)
+        selected = []
+        for segment in self._all_segments():
+            selected.extend(segment.select(run, cards_left, card))
+        return selected
+
+    def count(self, run=None, cards_left=None, card=None):
+        """Counts the outcomes of the coups matching all the given criteria
+        on the counters, without reading the coups. Takes the same arguments
+        as select().
+
+        Returns:
+            dict, with the number of banco, punto and tie outcomes.
+        """
+        run, cards_left, card = self._criteria(run, cards_left, card)
+        slot = 0
+        if card is not None:
+            hand, value = card
+            if not 0 <= value < NO_CARD:
+                return dict.fromkeys(OUTCOMES, 0)
+            slot = 3 * (1 + hand * NO_CARD + value)
+        totals = [0, 0, 0]
+        for (run_outcome, run_length, left), counts in self._counts.items():
+            if run is not None and (run_outcome != run[0] or run_length < run[1]):
+                continue
+            if cards_left is not None and not cards_left[0] <= left <= cards_left[1]:
+                continue
+            for result in range(3):
+                totals[result] += counts[slot + result]
+        return dict(zip(OUTCOMES, totals))
+
+    def frequency(self, run=None, cards_left=None, card=None):
+        """Returns the outcome frequencies of the coups matching all the given
+        criteria, together with the number of matching coups. Takes the same
+        arguments as select().
+
+        Returns:
+            tuple, dict with the frequency of each outcome and the number
+                of matching coups.
+        """
+        counts = self.count(run, cards_left, card)
+        total = sum(counts.values())
+        if not total:
+            return {outcome: 0.0 for outcome in OUTCOMES}, 0
+        return {outcome: counts[outcome] / total for outcome in OUTCOMES}, total
+
+    def coup(self, i):
+        """Returns a recorded coup as a tuple with the shoe number, the cards
+        left, the outcome and the card values of banco and punto hands.
+
+        Raises:
+            IndexError: If there is no such coup.
+        """
+        if not 0 <= i < self._num_coups:
+            raise IndexError('Coup out of range.')
+        if i >= self._current.first:
+            segment = self._current
+        else:
+            position = bisect.bisect([entry[0] for entry in self._segments], i) - 1
+            segment = self._segment(self._segments[position])
+        j = i - segment.first
+        cards = segment.cards[j * 6:j * 6 + 6]
+        return (segment.shoe[j], segment.cards_left[j], OUTCOMES[segment.outcome[j]],
+                [value for value in cards[:3] if value != NO_CARD],
+                [value for value in cards[3:] if value != NO_CARD])
+
+    def _write_end(self, history_file, directory):
+        """Writes the segment directory, the state of the last coup and the
+        counters, followed by their offset and the magic, which mark a
+        finished file.
+        """
+        offset = history_file.tell()
+        history_file.write(_COUNT.pack(len(directory)))
+        for first, num_coups, segment_offset in directory:
+            history_file.write(_DIRECTORY.pack(first, num_coups, segment_offset))
+        shoe, outcome, run_outcome, run_length = self._last or (-1, -1, -1, 0)
+        history_file.write(_LAST.pack(shoe, outcome, run_outcome, run_length))
+        history_file.write(_COUNT.pack(len(self._counts)))
+        for key, counts in self._counts.items():
+            history_file.write(_COUNTS_KEY.pack(*key))
+            counts.tofile(history_file)
+        history_file.write(_COUNT.pack(offset) + _MAGIC)
+
+    def close(self):
+        """Writes the last segment and the counters to the file of the
+        history and closes it. The history can still be queried.
+        """
+        if self._file is None:
+            return
+        if len(self._current):
+            self._finish_segment()
+        self._write_end(self._file, self._segments)
+        self._file.close()
+        self._file = None
+
+    def save(self, file_name):
+        """Writes the recorded coups, their indexes and the counters to a
+        binary file, a segment at a time.
+
+        Raises:
+            ValueError: If the history is written to a file while recording
+                or read from the same file.
+        """
+        if self._file is not None:
+            raise ValueError('History is written to its own file, close it instead.')
+        if self._file_name is not None and \
+                os.path.abspath(file_name) == os.path.abspath(self._file_name):
+            raise ValueError('History cannot be saved over the file it is read from.')
+        directory = []
+        with open(file_name, 'wb') as history_file:
+            history_file.write(_MAGIC)
+            for segment in self._all_segments():
+                directory.append((segment.first, len(segment), history_file.tell()))
+                segment.write(history_file)
+            self._write_end(history_file, directory)
+
+    @classmethod
+    def load(cls, file_name):
+        """Opens a binary file written by save() or close(). Only the segment
+        directory and the counters are read, the segments are read by the
+        queries that need them.
+
+        Raises:
+            ValueError: If the file is not a finished coup history file.
+        """
+        history = cls()
+        with open(file_name, 'rb') as history_file:
+            if history_file.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError('Not a coup history file.')
+            end = history_file.seek(0, os.SEEK_END) - _COUNT.size - len(_MAGIC)
+            history_file.seek(max(end, 0))
+            footer = history_file.read()
+            if end < len(_MAGIC) or footer[_COUNT.size:] != _MAGIC:
+                raise ValueError('Coup history file is not finished.')
+            offset, = _COUNT.unpack(footer[:_COUNT.size])
+            history_file.seek(offset)
+            num_segments, = _COUNT.unpack(history_file.read(_COUNT.size))
+            for i in range(num_segments):
+                first, num_coups, segment_offset = _DIRECTORY.unpack(
+                    history_file.read(_DIRECTORY.size))
+                history._segments.append((first, num_coups, segment_offset))
+                history._num_coups += num_coups
+            shoe, outcome, run_outcome, run_length = _LAST.unpack(
+                history_file.read(_LAST.size))
+            if shoe >= 0:
+                history._last = (shoe, outcome, run_outcome, run_length)
+                history._num_shoes = shoe + 1
+            num_keys, = _COUNT.unpack(history_file.read(_COUNT.size))
+            for i in range(num_keys):
+                key = _COUNTS_KEY.unpack(history_file.read(_COUNTS_KEY.size))
+                counts = history._counts[key] = array('Q')
+                counts.fromfile(history_file, 3 * _CARD_SLOTS)
+        history._file_name = file_name
+        history._current = _Segment(history._num_coups)
+        return history
+
+    @classmethod
+    def from_sim_file(cls, file_name, num_decks):
+        """Imports the text output of baccarat-sim.py.
+
+        Args:
+            file_name: str, path of the simulation output.
+            num_decks: int, number of decks per shoe used on the simulation.
+        """
+        history = cls()
+        results = {'B': 'banco', 'P': 'punto', 'T': 'tie'}
+        shoe = -1
+        with open(file_name) as sim_file:
+            for line in sim_file:
+                if line.startswith('Shoe number'):
+                    shoe += 1
+                    cards_left = num_decks * 52
+                elif line[:2] in ('B,', 'P,', 'T,'):
+                    fields = line.strip().split(',')
+                    banco_values = [int(v) for v in fields[3:6] if v != 'x']
+                    punto_values = [int(v) for v in fields[6:9] if v != 'x']
+                    history.append(shoe, cards_left, results[fields[0]],
+                                   banco_values, punto_values)
+                    cards_left -= len(banco_values) + len(punto_values)
+        return history
+
+    def __len__(self):
+        return self.num_coups
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f'CoupHistory({self.num_coups} coups)'
+
+def main():
+
+    # Argument parser
+    parser = argparse.ArgumentParser(description='Queries a recorded coup history.')
+    parser.add_argument('history', help='history file written by baccarat-sim.py -o, '
+                        'or a simulation text file when -d is given')
+    parser.add_argument('-d', action='store', dest='decks', type=int,
+                        help='import a simulation text file with this number of decks')
+    parser.add_argument('--run', nargs=2, metavar=('OUTCOME', 'LENGTH'),
+                        help='coups after at least LENGTH consecutive OUTCOME')
+    parser.add_argument('--cards-left', nargs=2, type=int, metavar=('LOW', 'HIGH'),
+                        help='coups dealt with LOW to HIGH cards left in the shoe')
+    parser.add_argument('--card', nargs=2, metavar=('HAND', 'VALUE'),
+                        help='coups where HAND holds a card with VALUE')
+    args = parser.parse_args()
+
+    if args.decks:
+        history = CoupHistory.from_sim_file(args.history, args.decks)
+    else:
+        history = CoupHistory.load(args.history)
+    run = (args.run[0], int(args.run[1])) if args.run else None
+    card = (args.card[0], int(args.card[1])) if args.card else None
+    cards_left = tuple(args.cards_left) if args.cards_left else None
+
+    frequencies, total = history.frequency(run, cards_left, card)
+    print(f'{total} of {history.num_coups} coups matched.')
+    for outcome in OUTCOMES:
+        print(f'{outcome.title()}:\t{round(frequencies[outcome] * 100, 4)}%')
+
+if __name__ == '__main__':
+    main()
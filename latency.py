@@ -0,0 +1,288 @@
+import threading
+import weakref
+
+STAGES = ['bet', 'deal_hands', 'draw_thirds', 'bet_result']
+PERCENTILES = [50, 90, 99, 99.9]
+
+# Each power of two is split in 2 ** _SUB_BITS buckets, which keeps every
+# recorded value within 1 / 2 ** _SUB_BITS of its bucket lower bound
+_SUB_BITS = 4
+_SUB_BUCKETS = 1 << _SUB_BITS
+
+def _bucket(value):
+    """Returns the bucket index of a value in nanoseconds."""
+    if value < 2 * _SUB_BUCKETS:
+        return value if value > 0 else 0
+    shift = value.bit_length() - _SUB_BITS - 1
+    return shift * _SUB_BUCKETS + (value >> shift)
+
+def _bucket_bounds(i):
+    """Returns the lowest and highest value of a bucket index."""
+    if i < 2 * _SUB_BUCKETS:
+        return i, i
+    shift = i // _SUB_BUCKETS - 1
+    mantissa = i - shift * _SUB_BUCKETS
+    return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+class LatencyHistogram:
+    """Histogram of latencies in nanoseconds with logarithmic buckets, in the
+    way of HDR histograms. The buckets are allocated upfront, recording a
+    value only increments a counter, and percentiles are exact to about 6%.
+    Values above the highest bucket are counted on it. Recording is not
+    locked, a histogram takes values from one thread, LatencyMonitor keeps
+    one per thread.
+
+    Args:
+        max_ns: int, highest latency told apart. Optional, default value 60
+            seconds.
+
+    Attributes:
+        count: int, number of recorded values.
+        total: int, sum of the recorded values.
+        min: int, lowest recorded value, 0 if empty.
+        max: int, highest recorded value, 0 if empty.
+        mean: float, mean of the recorded values, 0 if empty.
+
+    Raises:
+        ValueError: If max_ns is not positive.
+    """
+    def __init__(self, max_ns=60_000_000_000):
+        if max_ns < 1:
+            raise ValueError('Highest latency must be positive.')
+        self._max_ns = max_ns
+        self._counts = [0] * (_bucket(max_ns) + 1)
+        self._last = len(self._counts) - 1
+        self._count = 0
+        self._total = 0
+        self._min = 0
+        self._max = 0
+
+    @property
+    def count(self):
+        """Returns the number of recorded values."""
+        return self._count
+
+    @property
+    def total(self):
+        """Returns the sum of the recorded values."""
+        return self._total
+
+    @property
+    def min(self):
+        """Returns the lowest recorded value."""
+        return self._min
+
+    @property
+    def max(self):
+        """Returns the highest recorded value."""
+        return self._max
+
+    @property
+    def mean(self):
+        """Returns the mean of the recorded values."""
+        return self._total / self._count if self._count else 0
+
+    def record(self, value):
+        """Records a latency in nanoseconds."""
+        # Same as _bucket(), inlined as it runs on every recorded value
+        if value < 2 * _SUB_BUCKETS:
+            i = value if value > 0 else 0
+        else:
+            shift = value.bit_length() - _SUB_BITS - 1
+            i = shift * _SUB_BUCKETS + (value >> shift)
+        self._counts[i if i < self._last else self._last] += 1
+        if value > self._max:
+            self._max = value
+        if value < self._min or not self._count:
+            self._min = value
+        self._count += 1
+        self._total += value
+
+    def percentile(self, percent):
+        """Returns the latency under which a percent of the values fall, as
+        the highest value of its bucket, at most the highest recorded value.
+        0 if empty.
+        """
+        if not self._count:
+            return 0
+        rank = max(1, -(-self._count * percent // 100))
+        seen = 0
+        for i, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                return min(_bucket_bounds(i)[1], self._max)
+        return self._max
+
+    def buckets(self):
+        """Yields the buckets with values as tuples of lowest value, highest
+        value and count.
+        """
+        for i, count in enumerate(self._counts[:]):
+            if count:
+                yield _bucket_bounds(i) + (count,)
+
+    def merge(self, other):
+        """Adds the values of another histogram with the same buckets.
+
+        Raises:
+            ValueError: If the buckets do not match.
+        """
+        if other._max_ns != self._max_ns:
+            raise ValueError('Latency histograms have different buckets.')
+        count = other._count
+        if not count:
+            return
+        counts = self._counts
+        for i, bucket_count in enumerate(other._counts[:]):
+            if bucket_count:
+                counts[i] += bucket_count
+        if not self._count or other._min < self._min:
+            self._min = other._min
+        self._max = max(self._max, other._max)
+        self._count += count
+        self._total += other._total
+
+    def reset(self):
+        """Removes all the recorded values."""
+        self._counts = [0] * len(self._counts)
+        self._count = self._total = self._min = self._max = 0
+
+    def __repr__(self):
+        return f'LatencyHistogram({self._max_ns})'
+
+class _Recorder:
+    """Histograms of a thread, created on the first value of each stage. Held
+    only by the thread local storage, so it goes away with the thread.
+    """
+    def __init__(self):
+        self.histograms = {}
+
+class LatencyMonitor:
+    """Latency histograms of the stages of a table cycle. Every thread
+    records on histograms of its own, without locks, and queries merge the
+    histograms of the running threads with the ones left by the finished
+    threads, which are added up when each thread ends.
+
+    Args:
+        stages: iterable, names of the stages. Optional, defaults to STAGES.
+
+    Attributes:
+        stages: list, names of the stages.
+    """
+    def __init__(self, stages=None):
+        self._stages = list(STAGES if stages is None else stages)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._recorders = {}
+        self._finished = {stage: LatencyHistogram() for stage in self._stages}
+
+    @property
+    def stages(self):
+        """Returns the names of the stages."""
+        return self._stages[:]
+
+    def _histogram(self, stage):
+        """Creates the histogram of a stage for the current thread. It is
+        added under the lock, as queries walk the histograms of the thread.
+        """
+        if stage not in self._finished:
+            raise KeyError(stage)
+        try:
+            recorder = self._local.recorder
+        except AttributeError:
+            recorder = self._local.recorder = _Recorder()
+            histograms = recorder.histograms
+            with self._lock:
+                self._recorders[id(histograms)] = histograms
+            weakref.finalize(recorder, self._retire, histograms)
+        histogram = LatencyHistogram()
+        with self._lock:
+            recorder.histograms[stage] = histogram
+        return histogram
+
+    def _retire(self, histograms):
+        """Adds the histograms of a finished thread to the finished ones."""
+        with self._lock:
+            del self._recorders[id(histograms)]
+            for stage, histogram in histograms.items():
+                self._finished[stage].merge(histogram)
+
+    def record(self, stage, value):
+        """Records the latency of a stage in nanoseconds."""
+        try:
+            histogram = self._local.recorder.histograms[stage]
+        except (AttributeError, KeyError):
+            histogram = self._histogram(stage)
+        histogram.record(value)
+
+    def reset(self):
+        """Removes the recorded values of all the stages. Values recorded by
+        other threads meanwhile may be kept.
+        """
+        with self._lock:
+            for histograms in self._recorders.values():
+                for histogram in histograms.values():
+                    histogram.reset()
+            for histogram in self._finished.values():
+                histogram.reset()
+
+    def summary(self, percentiles=None):
+        """Returns a text table with the count, mean, percentiles and maximum
+        latency of each stage, in microseconds.
+
+        Args:
+            percentiles: list, percentiles to show. Optional, defaults to
+                PERCENTILES.
+        """
+        percentiles = PERCENTILES if percentiles is None else percentiles
+        columns = ['count', 'mean'] + [f'p{p:g}' for p in percentiles] + ['max']
+        width = max(len(stage) for stage in self._stages) + 2
+        lines = ['stage'.ljust(width) + ''.join(c.rjust(10) for c in columns)]
+        for stage in self._stages:
+            histogram = self[stage]
+            values = [histogram.mean] + [histogram.percentile(p) for p in percentiles] + \
+                     [histogram.max]
+            lines.append(stage.ljust(width) + str(histogram.count).rjust(10) +
+                         ''.join(f'{value / 1000:10.1f}' for value in values))
+        return '\n'.join(lines) + '\n'
+
+    def export(self, prefix='baccarat_table'):
+        """Returns the histograms in the Prometheus text format, in seconds.
+        The buckets are the same on every export, one per power of two
+        nanoseconds up to the highest latency told apart, as rate() and
+        histogram_quantile() need.
+
+        Args:
+            prefix: str, prefix of the metric name. Optional.
+        """
+        name = f'{prefix}_latency_seconds'
+        lines = [f'# HELP {name} Latency of the stages of the table cycle.',
+                 f'# TYPE {name} histogram']
+        for stage in self._stages:
+            histogram = self[stage]
+            buckets = list(histogram.buckets())
+            i = cumulative = 0
+            # Powers of two fall on bucket bounds, the values are integers
+            for power in range(1, histogram._max_ns.bit_length() + 1):
+                bound = (1 << power) - 1
+                while i < len(buckets) and buckets[i][1] <= bound:
+                    cumulative += buckets[i][2]
+                    i += 1
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound / 1e9:.9g}"}} '
+                             f'{cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.total / 1e9:.9g}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def __getitem__(self, stage):
+        """Returns a LatencyHistogram with the values of a stage recorded by
+        all the threads.
+        """
+        histogram = LatencyHistogram()
+        with self._lock:
+            histogram.merge(self._finished[stage])
+            for histograms in self._recorders.values():
+                if stage in histograms:
+                    histogram.merge(histograms[stage])
+        return histogram
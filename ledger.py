@@ -0,0 +1,266 @@
+import argparse
+import os
+import struct
+import zlib
+from writebehind import WriteBehind
+
+_MAGIC = b'BCLEDG1\n'
+# Sequence, coup, pid, kind, hand, amount, balance change and new balance,
+# followed by the CRC32 of those fields
+_ENTRY = struct.Struct('<QIIBBqqq')
+_CRC = struct.Struct('<I')
+ENTRY_SIZE = _ENTRY.size + _CRC.size
+
+KINDS = ['open', 'win', 'lose']
+HANDS = [None, 'punto', 'banco', 'tie']
+_KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+_HAND_CODES = {hand: code for code, hand in enumerate(HANDS)}
+
+def _scan(data):
+    """Returns the valid entries of a ledger file contents as tuples and the
+    size of the file up to the last valid entry.
+
+    Raises:
+        ValueError: If the data is not a ledger.
+    """
+    if data[:len(_MAGIC)] != _MAGIC:
+        raise ValueError('Not a bet ledger file.')
+    entries = []
+    offset = len(_MAGIC)
+    view = memoryview(data)
+    while offset + ENTRY_SIZE <= len(data):
+        crc, = _CRC.unpack_from(data, offset + _ENTRY.size)
+        if zlib.crc32(view[offset:offset + _ENTRY.size]) != crc:
+            break
+        entries.append(_ENTRY.unpack_from(data, offset))
+        offset += ENTRY_SIZE
+    return entries, offset
+
+class Ledger(WriteBehind):
+    """Append-only ledger of player balances and bet settlements on a binary
+    file. Amounts are integers, so the balances can be rebuilt exactly.
+
+    Entries are queued in memory and a background thread appends them and
+    syncs the file to disk once batch entries are pending or every interval
+    seconds, so a settlement never waits for the disk and the cost of a
+    sync is shared by the whole batch. Each entry carries a CRC32, a torn
+    entry at the end of the file after a crash is dropped when the file is
+    opened again. A batch that fails to be written is dropped from the file
+    and written again whole with the next one, its error is kept for
+    raise_error() meanwhile. Subclass of WriteBehind.
+
+    The ledger keeps the last balance recorded for each player, an opening
+    balance equal to it is not recorded again. Tables reserve the pids found
+    on the ledger, so players of different sessions never share a pid.
+
+    Args:
+        file_name: str, path of the ledger file. Created if it does not exist.
+        batch: int, pending entries that trigger a sync. Optional, default
+            value 1000.
+        interval: float, maximum seconds between syncs. Optional, default
+            value 0.1.
+
+    Attributes:
+        file_name: str, path of the ledger file.
+        pending: int, number of entries waiting to be synced.
+        last_seq: int, sequence number of the last entry, 0 if empty.
+        last_pid: int, highest pid on the ledger, 0 if empty.
+
+    Raises:
+        ValueError: If the file exists and is not a ledger.
+    """
+    def __init__(self, file_name, batch=1000, interval=0.1):
+        self._file_name = file_name
+        # Unbuffered, so a failed write leaves nothing behind to be written
+        self._file = open(file_name, 'a+b', buffering=0)
+        self._file.seek(0)
+        data = self._file.read()
+        if data:
+            entries, size = _scan(data)
+            self._seq = entries[-1][0] if entries else 0
+            self._balances = {entry[2]: entry[7] for entry in entries}
+            if size < len(data):
+                self._file.truncate(size)
+        else:
+            self._write(_MAGIC)
+            size = len(_MAGIC)
+            self._seq = 0
+            self._balances = {}
+        os.fsync(self._file.fileno())
+        self._size = size
+        self._buffer = bytearray()
+        self._pending = 0
+        WriteBehind.__init__(self, batch, interval)
+
+    @property
+    def file_name(self):
+        """Returns the path of the ledger file."""
+        return self._file_name
+
+    @property
+    def pending(self):
+        """Returns the number of entries waiting to be synced."""
+        with self._lock:
+            return self._pending
+
+    @property
+    def last_seq(self):
+        """Returns the sequence number of the last entry."""
+        return self._seq
+
+    @property
+    def last_pid(self):
+        """Returns the highest pid on the ledger."""
+        with self._lock:
+            return max(self._balances, default=0)
+
+    def _append(self, coup, pid, kind, hand, amount, change, balance):
+        with self._lock:
+            if not kind and self._balances.get(pid) == balance:
+                return
+            self._seq += 1
+            entry = _ENTRY.pack(self._seq, coup, pid, kind, hand, amount,
+                                change, balance)
+            self._buffer += entry
+            self._buffer += _CRC.pack(zlib.crc32(entry))
+            self._balances[pid] = balance
+            self._pending += 1
+            pending = self._pending
+        self._queued(pending)
+
+    def open_balance(self, pid, balance, coup=0):
+        """Queues the balance of a player joining the table, unless it is the
+        last balance recorded for the player. On replay, an opening balance
+        that differs from the rebuilt balance of a known player replaces it
+        and is reported as a mismatch.
+        """
+        self._append(coup, pid, _KIND_CODES['open'], _HAND_CODES[None], 0, 0, balance)
+
+    def record_settlement(self, coup, pid, hand, amount, result, change, balance):
+        """Queues a settled bet.
+
+        Args:
+            coup: int, the coup of the bet.
+            pid: int, the id of the player.
+            hand: str, the hand bet.
+            amount: int, the amount bet.
+            result: str, win or lose.
+            change: int, the change of the balance of the player.
+            balance: int, the balance of the player after the settlement.
+        """
+        self._append(coup, pid, _KIND_CODES[result], _HAND_CODES[hand], amount,
+                     change, balance)
+
+    def _write(self, data):
+        """Writes all the data at the end of the file."""
+        view = memoryview(data)
+        while view:
+            view = view[self._file.write(view):]
+
+    def _write_pending(self):
+        """Appends the pending entries and syncs the file to disk."""
+        with self._lock:
+            data, self._buffer = self._buffer, bytearray()
+            pending, self._pending = self._pending, 0
+        if not data:
+            return
+        try:
+            self._write(data)
+            os.fsync(self._file.fileno())
+        except OSError:
+            # Drop the part of the batch written, it is written again whole
+            # ahead of the entries queued meanwhile
+            try:
+                self._file.truncate(self._size)
+            except OSError:
+                pass
+            with self._lock:
+                self._buffer = data + self._buffer
+                self._pending += pending
+            raise
+        self._size += len(data)
+
+    def _close(self):
+        """Closes the ledger file."""
+        self._file.close()
+
+    def __repr__(self):
+        return f'Ledger(\'{self._file_name}\')'
+
+def read_entries(file_name):
+    """Reads the synced entries of a ledger file.
+
+    Returns:
+        list, with a tuple of sequence, coup, pid, kind, hand, amount,
+            balance change and balance for every entry, in order.
+
+    Raises:
+        ValueError: If the file is not a ledger.
+    """
+    with open(file_name, 'rb') as ledger_file:
+        data = ledger_file.read()
+    entries, size = _scan(data)
+    return [(seq, coup, pid, KINDS[kind], HANDS[hand], amount, change, balance)
+            for seq, coup, pid, kind, hand, amount, change, balance in entries]
+
+def replay(file_name):
+    """Rebuilds the balances of the players from a ledger file: opening
+    balances are set and the changes of the settlements added, then checked
+    against the balance recorded on each entry. An opening balance of a known
+    player is checked against the rebuilt balance too.
+
+    Returns:
+        tuple, dict with the balance of each pid, number of settlements and
+            list of the sequence numbers of the entries whose recorded
+            balance does not match the rebuilt one.
+
+    Raises:
+        ValueError: If the file is not a ledger.
+    """
+    with open(file_name, 'rb') as ledger_file:
+        data = ledger_file.read()
+    balances = {}
+    settlements = 0
+    mismatches = []
+    entries, size = _scan(data)
+    for seq, coup, pid, kind, hand, amount, change, balance in entries:
+        if kind:
+            settlements += 1
+            rebuilt = balances.get(pid, 0) + change
+            if rebuilt != balance:
+                mismatches.append(seq)
+            balances[pid] = rebuilt
+        else:
+            if pid in balances and balances[pid] != balance:
+                mismatches.append(seq)
+            balances[pid] = balance
+    return balances, settlements, mismatches
+
+def main():
+
+    # Argument parser
+    parser = argparse.ArgumentParser(description='Rebuilds the player balances '
+                                     'from a bet ledger file.')
+    parser.add_argument('file', help='ledger file')
+    parser.add_argument('-p', action='store', dest='pid', default=None, type=int,
+                        help='list the entries of a player')
+    args = parser.parse_args()
+
+    if args.pid is not None:
+        for entry in read_entries(args.file):
+            if entry[2] == args.pid:
+                seq, coup, pid, kind, hand, amount, change, balance = entry
+                bet = f'{amount} on {hand}, ' if hand else ''
+                print(f'{seq}\tcoup {coup}\t{kind}\t{bet}{change:+}\tbalance {balance}')
+        return
+
+    balances, settlements, mismatches = replay(args.file)
+    print(f'{settlements} settlements, {len(balances)} players.')
+    for pid in sorted(balances):
+        print(f'Player {pid}:\tbalance {balances[pid]}')
+    if mismatches:
+        print(f'{len(mismatches)} entries do not match the rebuilt balance, '
+              f'first at sequence {mismatches[0]}.')
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,8 @@
+# Winnings of each hand per amount bet, as numerator and denominator, so
+# payouts are computed with integers. Banco pays 19 to 20, even money less a
+# 5% commission, rounded down
+PAYOUTS = {'punto': (1, 1), 'banco': (19, 20), 'tie': (8, 1)}
+
 class Player:
     """A player of baccarat game. Create several instances to have multiplayer.
 
@@ -27,6 +32,36 @@ class Player:
         self._amount_bet = 0
         Player._pid += 1
 
+    @classmethod
+    def restore(cls, pid, balance):
+        """Recreates a stored player with its id and balance, which may be
+        zero. New players get ids after the restored ones.
+
+        Args:
+            pid: int, the id of the player.
+            balance: int, the balance of the player.
+
+        Returns:
+            Player, the restored player without a bet.
+        """
+        player = cls.__new__(cls)
+        player._pid = pid
+        player._balance = balance
+        player._hand_bet = None
+        player._amount_bet = 0
+        cls._pid = max(cls._pid, pid + 1)
+        return player
+
+    @classmethod
+    def reserve(cls, pid):
+        """Makes new players get ids after a pid already in use elsewhere,
+        like on a ledger.
+
+        Args:
+            pid: int, the highest id in use.
+        """
+        cls._pid = max(cls._pid, pid + 1)
+
     @property
     def pid(self):
         """Get the player id."""
@@ -49,8 +84,7 @@ class Player:
 
     @hand_bet.setter
     def hand_bet(self, hand):
-        if hand not in ['punto', 'banco', 'tie']:
-            raise ValueError('Invalid hand.')
+        self._check_hand(hand)
         self._hand_bet = hand
 
     @property
@@ -66,13 +100,31 @@ class Player:
 
     @amount_bet.setter
     def amount_bet(self, amount):
+        self._check_amount(amount)
+        self._amount_bet = amount
+
+    def _check_hand(self, hand):
+        if hand not in ['punto', 'banco', 'tie']:
+            raise ValueError('Invalid hand.')
+
+    def _check_amount(self, amount):
         if not isinstance(amount, int):
             raise TypeError('Amount must be a integer.')
         if amount < 1:
             raise ValueError('Amount must be positive.')
         if amount > self._balance:
             raise ValueError('Amount exceeds available balance.')
-        self._amount_bet = amount
+
+    def check_bet(self, hand, amount):
+        """Checks a bet without placing it.
+
+        Raises:
+            TypeError: If the amount is not an integer.
+            ValueError: If the hand is neither punto, banco or tie or the
+                amount is not positive or exceeds the available balance.
+        """
+        self._check_hand(hand)
+        self._check_amount(amount)
 
     def is_valid_bet(self):
         """Checks if the current bet is valid.
@@ -92,12 +144,8 @@ class Player:
             InvalidBet: If the player does not have a valid bet.
         """
         if self.is_valid_bet():
-            if self._hand_bet == 'punto':
-                self._balance += int(self._amount_bet * 1)
-            elif self._hand_bet == 'banco':
-                self._balance += int(self._amount_bet * 0.95)
-            elif self._hand_bet == 'tie':
-                self._balance += int(self._amount_bet * 8)
+            numerator, denominator = PAYOUTS[self._hand_bet]
+            self._balance += self._amount_bet * numerator // denominator
             self._hand_bet = None
             self._amount_bet = 0
         else:
@@ -0,0 +1,227 @@
+import argparse
+import random
+from cards import Shoe
+from compare import Estimate, Z_95
+from edge import draw_tables
+
+EVENTS = {
+    'tie': lambda coup: coup[0] == 'tie',
+    'natural': lambda coup: coup[3],
+    'dragon7': lambda coup: coup[0] == 'banco' and coup[2] == 7 and coup[5],
+    'panda8': lambda coup: coup[0] == 'punto' and coup[1] == 8 and coup[4]
+    }
+EVENTS_HELP = {
+    'tie': 'a tie',
+    'natural': 'a natural on either hand',
+    'dragon7': 'banco wins with three cards adding up to 7',
+    'panda8': 'punto wins with three cards adding up to 8'
+    }
+
+# Stages of a coup, named by the card drawn next
+PUNTO_1, PUNTO_2, BANCO_1, BANCO_2, PUNTO_3, BANCO_3, FINAL = range(7)
+
+class Guide:
+    """Chance of an event on the rest of a coup from every partial deal, to
+    steer the draws towards it. The chances are computed once, drawing with
+    replacement from the composition of a full shoe, so they are only a
+    guide: the likelihood ratio of the draws corrects for it.
+
+    States are tuples of the stage, punto value, banco value and punto third
+    card value, or the final coup tuple of play_coup() on FINAL.
+
+    Args:
+        event: str, name of the event on EVENTS.
+        composition: list, number of cards for each value from 0 to 9.
+    """
+    def __init__(self, event, composition):
+        self._happens = EVENTS[event]
+        total = sum(composition)
+        self._probabilities = [count / total for count in composition]
+        self._punto_draws, self._banco_draws = draw_tables()
+        self._chances = {}
+
+    def start(self):
+        """Returns the state before a coup is dealt."""
+        return (PUNTO_1, 0, 0, None)
+
+    def _close(self, punto, banco, natural, punto_third, banco_third):
+        outcome = 'banco' if banco > punto else 'punto' if punto > banco else 'tie'
+        return (FINAL, (outcome, punto, banco, natural, punto_third, banco_third))
+
+    def next(self, state, value):
+        """Returns the state after drawing a card value."""
+        stage, punto, banco, third = state
+        if stage == PUNTO_1:
+            return (PUNTO_2, value, banco, None)
+        elif stage == PUNTO_2:
+            return (BANCO_1, (punto + value) % 10, banco, None)
+        elif stage == BANCO_1:
+            return (BANCO_2, punto, value, None)
+        elif stage == BANCO_2:
+            banco = (banco + value) % 10
+            if punto >= 8 or banco >= 8:
+                return self._close(punto, banco, True, False, False)
+            elif self._punto_draws[punto]:
+                return (PUNTO_3, punto, banco, None)
+            elif self._banco_draws[banco][10]:
+                return (BANCO_3, punto, banco, None)
+            return self._close(punto, banco, False, False, False)
+        elif stage == PUNTO_3:
+            if self._banco_draws[banco][value]:
+                return (BANCO_3, (punto + value) % 10, banco, value)
+            return self._close((punto + value) % 10, banco, False, True, False)
+        return self._close(punto, (banco + value) % 10, False,
+                           third is not None, True)
+
+    def chance(self, state):
+        """Returns the chance of the event on the rest of the coup."""
+        if state[0] == FINAL:
+            return 1.0 if self._happens(state[1]) else 0.0
+        try:
+            return self._chances[state]
+        except KeyError:
+            chance = sum(probability * self.chance(self.next(state, value))
+                         for value, probability in enumerate(self._probabilities))
+            self._chances[state] = chance
+            return chance
+
+class SampledShoe:
+    """Card value counts of a shoe drawn with importance sampling. Draws are
+    made with a probability proportional to the count of each value times a
+    factor, and every draw multiplies the likelihood ratio that turns the
+    biased draws back into unbiased estimates.
+
+    Args:
+        composition: list, number of cards for each value from 0 to 9.
+        rng: random.Random instance.
+
+    Attributes:
+        ratio: float, likelihood ratio of the draws so far.
+    """
+    def __init__(self, composition, rng):
+        self._counts = list(composition)
+        self._left = sum(composition)
+        self._rng = rng
+        self.ratio = 1.0
+
+    def draw(self, factors=None):
+        """Draws a card value, with the factor of each value if given.
+
+        Returns:
+            int, the value drawn, or None if no value has a positive weight.
+        """
+        counts = self._counts
+        if factors is None:
+            weights = counts
+        else:
+            weights = [count * factor for count, factor in zip(counts, factors)]
+        total = sum(weights)
+        if not total:
+            return None
+        target = self._rng.random() * total
+        for value in range(10):
+            if weights[value]:
+                drawn = value
+                target -= weights[value]
+                if target < 0:
+                    break
+        self.ratio *= total * counts[drawn] / (self._left * weights[drawn])
+        counts[drawn] -= 1
+        self._left -= 1
+        return drawn
+
+def play_coup(shoe, guide, guided=True):
+    """Plays a coup drawing card values from a SampledShoe.
+
+    Args:
+        shoe: SampledShoe, where the cards are drawn.
+        guide: Guide, of the event to steer the draws to.
+        guided: bool, steer the draws. Optional, default True. Without it
+            the draws are plain Monte Carlo.
+
+    Returns:
+        tuple, with the outcome, punto value, banco value, if there was a
+            natural and if punto and banco drew a third card. None if the
+            event can no longer happen on a guided coup.
+    """
+    state = guide.start()
+    while state[0] != FINAL:
+        factors = None
+        if guided:
+            factors = [guide.chance(guide.next(state, value)) for value in range(10)]
+        value = shoe.draw(factors)
+        if value is None:
+            return None
+        state = guide.next(state, value)
+    return state[1]
+
+def estimate(event, length=1, decks=8, samples=10000, guided=True, seed=None):
+    """Estimates the probability of an event on each of the first coups of
+    a shoe with importance sampling.
+
+    Args:
+        event: str, name of the event on EVENTS.
+        length: int, number of consecutive coups with the event. Optional,
+            default value 1.
+        decks: int, number of decks of the shoe. Optional, default value 8.
+        samples: int, number of sampled shoes. Optional, default value 10000.
+        guided: bool, steer the draws towards the event. Optional, default
+            True. Without it the estimate is plain Monte Carlo.
+        seed: int, seed of the samples. Optional.
+
+    Returns:
+        tuple, Estimate of the probability and number of samples with the
+            event.
+    """
+    happens = EVENTS[event]
+    composition = Shoe(decks).composition
+    guide = Guide(event, composition)
+    rng = random.Random(seed)
+    result = Estimate()
+    hits = 0
+    for i in range(samples):
+        shoe = SampledShoe(composition, rng)
+        for coup in range(length):
+            played = play_coup(shoe, guide, guided)
+            if played is None or not happens(played):
+                result.add(0.0)
+                break
+        else:
+            result.add(shoe.ratio)
+            hits += 1
+    return result, hits
+
+def main():
+
+    # Argument parser
+    parser = argparse.ArgumentParser(description='Estimates rare baccarat events '
+                                     'with importance sampling.')
+    parser.add_argument('event', choices=EVENTS, help=', '.join(
+        f'{name}: {text}' for name, text in EVENTS_HELP.items()))
+    parser.add_argument('-k', action='store', dest='length', default=1, type=int,
+                        help='consecutive coups with the event from the start of '
+                        'the shoe, default 1')
+    parser.add_argument('-n', action='store', dest='samples', default=10000,
+                        type=int, help='number of sampled shoes, default 10000')
+    parser.add_argument('-d', action='store', dest='decks', default=8,
+                        type=int, help='number of decks per shoe, default 8')
+    parser.add_argument('--plain', action='store_true',
+                        help='plain Monte Carlo, without importance sampling')
+    parser.add_argument('--seed', action='store', dest='seed', default=None,
+                        type=int, help='seed of the samples')
+    args = parser.parse_args()
+
+    result, hits = estimate(args.event, args.length, args.decks, args.samples,
+                            not args.plain, args.seed)
+    probability = result.mean
+    print(f'{args.length} x {EVENTS_HELP[args.event]}, {args.decks} decks shoe.')
+    print(f'Probability:\t{probability:.6e} ± {result.interval:.3e} (95%)')
+    print(f'Variance:\t{result.variance / args.samples:.3e}')
+    print(f'Samples:\t{args.samples}, {hits} with the event')
+    if probability > 0 and result.variance > 0:
+        plain = probability * (1 - probability) / result.variance
+        print(f'Relative error:\t{result.interval / Z_95 / probability:.2%}')
+        print(f'Efficiency:\t{plain:.1f}x plain Monte Carlo samples')
+
+if __name__ == '__main__':
+    main()
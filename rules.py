@@ -1,6 +1,13 @@
-from cards import Card, Shoe
+import random
+import threading
+from time import perf_counter_ns
+from cards import Card, Shoe, DECK
 from hands import Punto, Banco
 from players import Player
+from events import Dispatcher, Subscription
+from latency import LatencyMonitor
+from shuffles import find_model
+from snapshot import TableState, pack, unpack
 
 class Game:
     """Application of the rules of baccarat - punto banco variation. This class
@@ -16,12 +23,15 @@ class Game:
         banco_value: int, value of banco hand.
         banco_cards: str, cards of banco hand.
         num_decks: int, current number of decks in the shoe.
+        coup: int, number of coups dealt.
     """
     def __init__(self, num_decks=8):
         self._game_running = False
         self._players = []
         self._punto = None
         self._banco = None
+        self._coup = 0
+        self._events = None
         self.create_shoe(num_decks)
 
     @property
@@ -106,9 +116,59 @@ class Game:
         """Returns current number of cards in shoe."""
         return self._shoe.num_cards
 
-    def create_shoe(self, num_decks):
-        """Creates an instance of Shoe with num_decks."""
-        self._shoe = Shoe(num_decks)
+    @property
+    def num_dealt(self):
+        """Returns the number of cards drawn from shoe."""
+        return self._shoe.num_dealt
+
+    @property
+    def coup(self):
+        """Returns the number of coups dealt."""
+        return self._coup
+
+    def subscribe(self, callback, events=None, batch=1):
+        """Subscribes a callback to the events of the game. Events are only
+        built while there are subscribers.
+
+        Args:
+            callback: callable, receives a list of events.Event.
+            events: iterable, names of the events to receive, from
+                events.EVENTS. Optional, defaults to all events.
+            batch: int, number of events per call. Optional, default value 1.
+
+        Returns:
+            Subscription, to be used to unsubscribe.
+        """
+        subscription = Subscription(callback, events, batch)
+        if self._events is None:
+            self._events = Dispatcher()
+        self._events.subscribe(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Delivers the buffered events of a subscription and removes it."""
+        if self._events is None:
+            raise ValueError('Not subscribed.')
+        self._events.unsubscribe(subscription)
+        if not self._events:
+            self._events = None
+
+    def flush_events(self):
+        """Delivers the buffered events of all subscriptions."""
+        if self._events is not None:
+            self._events.flush()
+
+    def _emit_result(self, natural):
+        """Emits the result event of a closed game."""
+        self._events.emit('result', self._coup,
+                          (self.game_result(), self._punto.value,
+                           self._banco.value, natural))
+
+    def create_shoe(self, num_decks, shuffle=None, rng=None):
+        """Creates an instance of Shoe with num_decks, an optional shuffle
+        model and random number generator.
+        """
+        self._shoe = Shoe(num_decks, shuffle, rng)
         self._num_decks = num_decks
 
     def deal_hands(self):
@@ -123,6 +183,10 @@ class Game:
         self._punto = Punto(self._shoe.draw_cards(2))
         self._banco = Banco(self._shoe.draw_cards(2))
         self._game_running = True
+        self._coup += 1
+        if self._events is not None:
+            self._events.emit('coup_dealt', self._coup,
+                              (self._punto.cards[:], self._banco.cards[:]))
 
     def is_natural(self):
         """Checks if there is an hand with a natural. If there is closes the
@@ -139,6 +203,8 @@ class Game:
         natural = self._punto.is_natural() or self._banco.is_natural()
         if natural:
             self._game_running = False
+            if self._events is not None:
+                self._emit_result(True)
         return natural
 
     def draw_thirds(self):
@@ -166,6 +232,12 @@ class Game:
             self._banco.add_cards(self._shoe.draw_cards(1))
             third_draws.append(['banco', self._banco.cards[2].__str__()])
         self._game_running = False
+        if self._events is not None:
+            for hand in (self._punto, self._banco):
+                if len(hand.cards) == 3:
+                    name = 'punto' if hand is self._punto else 'banco'
+                    self._events.emit('third_card', self._coup, (name, hand.cards[2]))
+            self._emit_result(False)
         return third_draws
 
     def game_result(self):
@@ -196,16 +268,47 @@ class Table(Game):
     """Table of a game of baccarat. Introduces the players and betting system.
     Sets the bets as open. Subclass of Game.
 
+    Args:
+        num_decks: int, number of decks of the initial shoe. Optional, default
+            value 8.
+        store: PlayerStore, persistent storage of the players and their bets.
+            The stored players are loaded on the table. Optional.
+        ledger: Ledger, append-only record of the balances of the players
+            and every settlement. New players get pids after the ones on it.
+            Optional.
+
     Attributes:
         num_players: int, total number of players.
         available_players: list, with the indexes of the players that are still
             in game with a positive balance.
         valid_bets: list, with the indexes of the players that currently have a
             valid bet on the table.
+        bets_open: bool, if bets are accepted.
+        bet_batch: dict, the bets accepted on the last betting window, by
+            player index, as tuples of hand and amount.
+        latency: LatencyMonitor, latency histograms of bet, deal_hands,
+            draw_thirds and bet_result, always recorded.
     """
-    def __init__(self, num_decks=8):
-        self._bets_open = True
+    def __init__(self, num_decks=8, store=None, ledger=None):
+        self._window = BetWindow()
+        self._bet_batch = {}
+        self._latency = LatencyMonitor()
         Game.__init__(self, num_decks)
+        self._store = store
+        self._ledger = ledger
+        if store is not None:
+            for pid, balance in store.load_players():
+                self._players.append(Player.restore(pid, balance))
+        self._open_balances()
+
+    def _open_balances(self):
+        """Reserves the pids on the ledger and records the balances of the
+        players on the table to it.
+        """
+        if self._ledger is not None:
+            Player.reserve(self._ledger.last_pid)
+            for player in self._players:
+                self._ledger.open_balance(player.pid, player.balance, self._coup)
 
     @property
     def num_players(self):
@@ -230,14 +333,36 @@ class Table(Game):
                 players.append(player_i)
         return players
 
+    @property
+    def bets_open(self):
+        """Returns if bets are accepted."""
+        return self._window.is_open
+
+    @property
+    def bet_batch(self):
+        """Returns the bets accepted on the last betting window."""
+        return self._bet_batch
+
+    @property
+    def latency(self):
+        """Returns the latency histograms of the table cycle."""
+        return self._latency
+
     def deal_hands(self):
         """Deals both hands. Calls deal_hands from the superclass Game. Sets the
-        bets as closed.
+        bets as closed, the accepted bets are kept as the bet batch.
         """
-        if not self._bets_open:
-            raise GameError('There are some bets on table.')
-        self._bets_open = False
+        start = perf_counter_ns()
+        self._bet_batch = self._window.close()
         Game.deal_hands(self)
+        self._latency.record('deal_hands', perf_counter_ns() - start)
+
+    def draw_thirds(self):
+        """Draws the third cards. Calls draw_thirds from the superclass Game."""
+        start = perf_counter_ns()
+        third_draws = Game.draw_thirds(self)
+        self._latency.record('draw_thirds', perf_counter_ns() - start)
+        return third_draws
 
     def add_player(self, balance):
         """Add a new player to the table.
@@ -245,10 +370,27 @@ class Table(Game):
         Args:
             balance: int, the initial balance of the player.
         """
-        self._players.append(Player(balance))
+        player = Player(balance)
+        self._players.append(player)
+        if self._store is not None:
+            self._store.save_player(player.pid, player.balance)
+        if self._ledger is not None:
+            self._ledger.open_balance(player.pid, player.balance, self._coup)
+        self._raise_write_errors()
+
+    def _raise_write_errors(self):
+        """Raises the error of a failed write of the ledger or the store, if
+        any. Called once the bookkeeping is done, so an error never leaves it
+        halfway.
+        """
+        if self._ledger is not None:
+            self._ledger.raise_error()
+        if self._store is not None:
+            self._store.raise_error()
 
     def bet(self, player_i, hand_bet, amount_bet):
-        """Place a bet.
+        """Place a bet. Safe to call from several threads, the bet is checked
+        before taking the betting window lock and placed as a whole.
 
         Args:
             player_i: int, index of the player that will make the bet.
@@ -258,10 +400,13 @@ class Table(Game):
         Raises:
             GameError: If the bets are closed.
         """
-        if not self._bets_open:
+        start = perf_counter_ns()
+        player = self._players[player_i]
+        if not self._window.is_open:
             raise GameError('A player cannot make a bet after the hands are dealt.')
-        self._players[player_i].hand_bet = hand_bet
-        self._players[player_i].amount_bet = amount_bet
+        player.check_bet(hand_bet, amount_bet)
+        self._window.accept(player_i, player, hand_bet, amount_bet)
+        self._latency.record('bet', perf_counter_ns() - start)
 
     def bet_result(self, player_i):
         """Apply the result, win or loss, of a bet according to the result of a game.
@@ -269,18 +414,141 @@ class Table(Game):
         Args:
             player_i: int, the index of the player to apply the bet result.
         """
-        if self._players[player_i].hand_bet == self.game_result():
-            self._players[player_i].win()
-            result = ('win', self._players[player_i].balance)
+        start = perf_counter_ns()
+        player = self._players[player_i]
+        hand_bet = player.hand_bet
+        amount_bet = player.amount_bet
+        balance = player.balance
+        if hand_bet == self.game_result():
+            player.win()
+            result = ('win', player.balance)
         else:
-            self._players[player_i].lose()
-            result = ('lose', self._players[player_i].balance)
+            player.lose()
+            result = ('lose', player.balance)
+        if self._ledger is not None:
+            self._ledger.record_settlement(self._coup, player.pid, hand_bet,
+                                           amount_bet, result[0],
+                                           player.balance - balance, player.balance)
+        if self._store is not None:
+            self._store.record_bet(player.pid, self._coup, hand_bet,
+                                   amount_bet, *result)
+        if self._events is not None:
+            self._events.emit('bet_settled', self._coup,
+                              (player_i, hand_bet, amount_bet) + result)
+        self._latency.record('bet_result', perf_counter_ns() - start)
         return result
 
+    def settle_bets(self):
+        """Applies the result of every bet on the bet batch.
+
+        Returns:
+            dict, with the bet result of each player index.
+
+        Raises:
+            Exception: The error of a failed write of the ledger or the store,
+                once every bet is settled.
+        """
+        results = {}
+        for player_i in self._bet_batch:
+            if self._players[player_i].is_valid_bet():
+                results[player_i] = self.bet_result(player_i)
+        self._raise_write_errors()
+        return results
+
     def open_bets(self):
+        """Opens a new betting window once all bets were settled.
+
+        Returns:
+            bool, True if bets are open, False otherwise.
+        """
         if not self.valid_bets:
-            self._bets_open = True
-        return self._bets_open
+            self._window.open()
+        return self._window.is_open
+
+    def snapshot(self):
+        """Takes a compact binary snapshot of the table: the shoe in order,
+        the hands, the players with their bets, the betting window and the
+        state of the random number generator of the shoe. Subscriptions and
+        the store are not part of it.
+
+        Returns:
+            bytes, the snapshot, to be restored with Table.restore().
+        """
+        cards, discards, num_dealt, rng_state = self._shoe.snapshot()
+        bets_open, window_bets, players = self._window.snapshot(self._players)
+        hands = [bytes(card.code for card in hand.cards) if hand else b''
+                 for hand in (self._punto, self._banco)]
+        return pack(TableState(self._num_decks, self._coup, num_dealt,
+                               self._game_running, bets_open,
+                               repr(self._shoe.shuffle), cards, discards,
+                               hands[0], hands[1], rng_state, players,
+                               window_bets, self._bet_batch))
+
+    @classmethod
+    def restore(cls, data, store=None, shuffle=None, ledger=None):
+        """Recreates a table from a snapshot, to take over a live table. The
+        restored table deals the same cards the snapshotted one would have.
+
+        Args:
+            data: bytes, snapshot taken by snapshot().
+            store: PlayerStore, where the players and their bets are saved
+                from now on. The players are not loaded from it. Optional.
+            shuffle: shuffle model of the shoe. Optional, only needed when
+                it is not one of the defaults of shuffles.MODELS.
+            ledger: Ledger, where the settlements are recorded from now on,
+                starting with the restored balances. Optional.
+
+        Returns:
+            Table, the restored table.
+
+        Raises:
+            ValueError: If the snapshot is not valid or its shuffle model is
+                unknown and not given.
+        """
+        state = unpack(data)
+        if shuffle is None:
+            shuffle = find_model(state.shuffle)
+            if shuffle is None:
+                raise ValueError(f'Unknown shuffle model {state.shuffle}.')
+        rng = None
+        if state.rng_state is not None:
+            rng = random.Random()
+            rng.setstate(state.rng_state)
+        table = cls.__new__(cls)
+        table._window = BetWindow(state.bets_open, state.window_bets)
+        table._bet_batch = state.bet_batch
+        table._latency = LatencyMonitor()
+        table._store = store
+        table._ledger = ledger
+        table._events = None
+        table._coup = state.coup
+        table._game_running = state.running
+        table._num_decks = state.num_decks
+        table._shoe = Shoe.restore(state.num_decks, state.cards, state.discards,
+                                   state.num_dealt, shuffle, rng)
+        table._punto = Punto([DECK[code] for code in state.punto]) if state.punto else None
+        table._banco = Banco([DECK[code] for code in state.banco]) if state.banco else None
+        table._players = []
+        for pid, balance, hand_bet, amount_bet in state.players:
+            player = Player.restore(pid, balance)
+            if hand_bet is not None:
+                player.hand_bet = hand_bet
+                player.amount_bet = amount_bet
+            table._players.append(player)
+        table._open_balances()
+        return table
+
+    def close(self):
+        """Delivers the buffered events and commits and closes the store and
+        the ledger.
+        """
+        self.flush_events()
+        try:
+            if self._store is not None:
+                self._store.close()
+        finally:
+            if self._ledger is not None:
+                self._ledger.close()
 
     def __getitem__(self, player_i):
         """Get the status of a player.
@@ -293,5 +561,83 @@ class Table(Game):
         """
         return self._players[player_i].__str__()
 
+class BetWindow:
+    """Betting window of a table. Bets are accepted from any thread while the
+    window is open, closing it takes all the accepted bets as one batch.
+
+    Args:
+        is_open: bool, if the window starts open. Optional, default True.
+        bets: dict, bets already accepted. Optional.
+
+    Attributes:
+        is_open: bool, if bets are accepted.
+    """
+    def __init__(self, is_open=True, bets=None):
+        self._lock = threading.Lock()
+        self._close_lock = threading.Lock()
+        self._open = is_open
+        self._bets = dict(bets) if bets else {}
+
+    @property
+    def is_open(self):
+        """Returns if bets are accepted."""
+        return self._open
+
+    def accept(self, player_i, player, hand_bet, amount_bet):
+        """Places a checked bet on the player and adds it to the batch. A bet
+        from the same player replaces the previous one.
+
+        Raises:
+            GameError: If the window is closed.
+        """
+        with self._lock:
+            if not self._open:
+                raise GameError('A player cannot make a bet after the hands are dealt.')
+            player.hand_bet = hand_bet
+            player.amount_bet = amount_bet
+            self._bets[player_i] = (hand_bet, amount_bet)
+
+    def close(self):
+        """Closes the window.
+
+        Returns:
+            dict, the accepted bets by player index, as tuples of hand and
+                amount.
+
+        Raises:
+            GameError: If the window is already closed.
+        """
+        with self._close_lock:
+            if not self._open:
+                raise GameError('There are some bets on table.')
+            # Refuse new bets before waiting for the lock, so that busy
+            # betting threads cannot keep the window open
+            self._open = False
+        with self._lock:
+            bets, self._bets = self._bets, {}
+        return bets
+
+    def snapshot(self, players):
+        """Reads the window and the bets of the players at once, so no bet
+        is caught half placed.
+
+        Args:
+            players: list, the Player objects of the table.
+
+        Returns:
+            tuple, if the window is open, a copy of the accepted bets and a
+                list with the pid, balance, hand bet and amount bet of each
+                player.
+        """
+        with self._lock:
+            return self._open, dict(self._bets), [
+                (player.pid, player.balance, player.hand_bet, player.amount_bet)
+                for player in players]
+
+    def open(self):
+        """Opens the window for a new batch of bets."""
+        with self._lock:
+            self._open = True
+
 class GameError(Exception):
     pass
@@ -0,0 +1,384 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from shuffles import MODELS
+from simulation import play_shoes, write_totals
+
+def job_key(params):
+    """Returns the cache key of a simulation, a hash of its parameters."""
+    text = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+def check_params(params):
+    """Validates the parameters of a simulation and fills in the defaults.
+
+    Returns:
+        dict, with decks, shoes, seed and shuffle.
+
+    Raises:
+        ValueError: If the parameters are not a dict or on an unknown or
+            invalid parameter.
+    """
+    if not isinstance(params, dict):
+        raise ValueError('Parameters must be an object.')
+    defaults = {'decks': 8, 'shoes': 10000, 'seed': 0, 'shuffle': 'perfect'}
+    for name in params:
+        if name not in defaults:
+            raise ValueError(f'Unknown parameter {name}.')
+    params = dict(defaults, **params)
+    for name in ['decks', 'shoes', 'seed']:
+        if not isinstance(params[name], int) or isinstance(params[name], bool):
+            raise ValueError(f'{name.title()} must be an integer.')
+    if params['decks'] < 1 or params['shoes'] < 1:
+        raise ValueError('Decks and shoes must be positive.')
+    if params['shuffle'] not in MODELS:
+        raise ValueError('Unknown shuffle model.')
+    return params
+
+def _play_part(params, start, stop, file_name):
+    """Plays a range of shoes on a worker process into a part file."""
+    with open(file_name, 'w') as part_file:
+        return play_shoes(part_file, params['decks'], start, stop,
+                          params['shuffle'], params['seed'])
+
+class Job:
+    """A simulation requested to the service. Parts of its shoes are played
+    by the worker processes and joined in order once all are done.
+
+    Attributes:
+        key: str, cache key of the job.
+        params: dict, parameters of the simulation.
+        status: str, queued, running, done or failed.
+        shoes_done: int, number of shoes played.
+    """
+    def __init__(self, key, params):
+        self.key = key
+        self.params = params
+        self.status = 'queued'
+        self.shoes_done = 0
+        self.total_wins = {'banco': 0, 'punto': 0, 'tie': 0}
+        self.game_count = 0
+        self.error = None
+        self.futures = []
+        self.changed = threading.Condition()
+
+    @property
+    def finished(self):
+        """Returns if the job is done or failed."""
+        return self.status in ('done', 'failed')
+
+    def state(self):
+        """Returns the state of the job as a dict for the API."""
+        state = {'job': self.key, 'params': self.params, 'status': self.status,
+                 'shoes_done': self.shoes_done,
+                 'progress': round(self.shoes_done / self.params['shoes'] * 100, 1)}
+        if self.status == 'done':
+            state['total_wins'] = self.total_wins
+            state['game_count'] = self.game_count
+        if self.error:
+            state['error'] = self.error
+        return state
+
+class JobService:
+    """Runs simulations on a pool of worker processes and caches the results
+    by their parameters. A request equal to a running or finished one is
+    served by it instead of being played again.
+
+    Args:
+        cache_dir: str, directory of the cached results. Optional, default
+            value sim-cache.
+        workers: int, number of worker processes. Optional, defaults to the
+            number of CPUs.
+        part: int, number of shoes played by a worker at once. Optional,
+            default value 100.
+    """
+    def __init__(self, cache_dir='sim-cache', workers=None, part=100):
+        os.makedirs(cache_dir, exist_ok=True)
+        self._cache_dir = cache_dir
+        self._part = part
+        self._pool = ProcessPoolExecutor(workers)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key, extension):
+        return os.path.join(self._cache_dir, f'{key}.{extension}')
+
+    def output(self, key):
+        """Returns the path of the text output of a finished job."""
+        return self._path(key, 'txt')
+
+    def job(self, key):
+        """Returns a job by its key, from memory or from the cache.
+
+        Raises:
+            KeyError: If there is no such job.
+        """
+        with self._lock:
+            if key in self._jobs:
+                return self._jobs[key]
+            try:
+                with open(self._path(key, 'json')) as cache_file:
+                    cached = json.load(cache_file)
+            except FileNotFoundError:
+                raise KeyError(key)
+            job = Job(key, cached['params'])
+            job.status = 'done'
+            job.shoes_done = cached['params']['shoes']
+            job.total_wins = cached['total_wins']
+            job.game_count = cached['game_count']
+            self._jobs[key] = job
+            return job
+
+    def submit(self, params):
+        """Submits a simulation, unless an equal one was already submitted.
+
+        Returns:
+            Job, the new, running or cached job.
+        """
+        params = check_params(params)
+        key = job_key(params)
+        try:
+            return self.job(key)
+        except KeyError:
+            pass
+        with self._lock:
+            if key in self._jobs:
+                return self._jobs[key]
+            job = self._jobs[key] = Job(key, params)
+        parts = []
+        sizes = []
+        for start in range(0, params['shoes'], self._part):
+            stop = min(start + self._part, params['shoes'])
+            part_name = self._path(key, f'part{len(parts)}')
+            job.futures.append(self._pool.submit(_play_part, params, start, stop,
+                                                 part_name))
+            parts.append(part_name)
+            sizes.append(stop - start)
+        # Callbacks are added once all the parts are submitted, so a failed
+        # part sees every future of the job
+        for future, shoes in zip(job.futures, sizes):
+            future.add_done_callback(
+                lambda future, shoes=shoes: self._part_done(job, parts, future, shoes))
+        return job
+
+    def _part_done(self, job, parts, future, shoes):
+        """Adds the counters of a finished part and joins the output when it
+        was the last one.
+        """
+        with job.changed:
+            if job.status == 'failed':
+                self._discard(job, parts)
+                return
+            if job.finished:
+                return
+            try:
+                total_wins, game_count = future.result()
+            except Exception as error:
+                job.status = 'failed'
+                job.error = str(error)
+                job.changed.notify_all()
+                for other in job.futures:
+                    other.cancel()
+                self._discard(job, parts)
+                return
+            job.status = 'running'
+            job.shoes_done += shoes
+            job.game_count += game_count
+            for win in total_wins:
+                job.total_wins[win] += total_wins[win]
+            if job.shoes_done == job.params['shoes']:
+                self._finish(job, parts)
+                job.status = 'done'
+            job.changed.notify_all()
+
+    def _discard(self, job, parts):
+        """Removes the part files of a failed job once none of its parts is
+        running, and only then lets its key be submitted again.
+        """
+        if not all(future.done() for future in job.futures):
+            return
+        for part_name in parts:
+            try:
+                os.remove(part_name)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+
+    def _finish(self, job, parts):
+        """Joins the parts into the cached output and records the counters."""
+        output = self._path(job.key, 'txt.tmp')
+        with open(output, 'w') as sim_file:
+            for part_name in parts:
+                with open(part_name) as part_file:
+                    shutil.copyfileobj(part_file, sim_file)
+                os.remove(part_name)
+            write_totals(sim_file, job.total_wins, job.game_count)
+        os.replace(output, self._path(job.key, 'txt'))
+        cached = {'params': job.params, 'total_wins': job.total_wins,
+                  'game_count': job.game_count}
+        with open(self._path(job.key, 'json.tmp'), 'w') as cache_file:
+            json.dump(cached, cache_file)
+        os.replace(self._path(job.key, 'json.tmp'), self._path(job.key, 'json'))
+
+    def follow(self, job, timeout=30):
+        """Yields the state of a job every time it changes, until it is
+        finished.
+        """
+        last = None
+        while True:
+            with job.changed:
+                if job.shoes_done == last and not job.finished:
+                    job.changed.wait(timeout)
+                state = job.state()
+            if state['shoes_done'] != last or job.finished:
+                last = state['shoes_done']
+                yield state
+            if job.finished:
+                return
+
+    def shutdown(self):
+        """Stops the worker processes."""
+        self._pool.shutdown(cancel_futures=True)
+
+class JobHandler(BaseHTTPRequestHandler):
+    """HTTP API of a JobService.
+
+    POST /jobs with the parameters as JSON submits a job.
+    GET /jobs/<key> returns the state of a job.
+    GET /jobs/<key>/progress streams the state of a job, one JSON per line.
+    GET /jobs/<key>/output returns the text output of a finished job.
+    """
+    def _send_json(self, code, data):
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path != '/jobs':
+            return self._send_json(404, {'error': 'Not found.'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            params = json.loads(self.rfile.read(length) or b'{}')
+            job = self.server.service.submit(params)
+        except ValueError as error:
+            return self._send_json(400, {'error': str(error)})
+        self._send_json(200, job.state())
+
+    def do_GET(self):
+        parts = self.path.strip('/').split('/')
+        if len(parts) not in (2, 3) or parts[0] != 'jobs':
+            return self._send_json(404, {'error': 'Not found.'})
+        try:
+            job = self.server.service.job(parts[1])
+        except KeyError:
+            return self._send_json(404, {'error': 'Unknown job.'})
+        if len(parts) == 2:
+            self._send_json(200, job.state())
+        elif parts[2] == 'progress':
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.end_headers()
+            for state in self.server.service.follow(job):
+                self.wfile.write(json.dumps(state).encode() + b'\n')
+                self.wfile.flush()
+        elif parts[2] == 'output':
+            if job.status != 'done':
+                return self._send_json(409, {'error': 'Job is not done.'})
+            file_name = self.server.service.output(job.key)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(os.path.getsize(file_name)))
+            self.end_headers()
+            with open(file_name, 'rb') as sim_file:
+                shutil.copyfileobj(sim_file, self.wfile)
+        else:
+            self._send_json(404, {'error': 'Not found.'})
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port, cache_dir='sim-cache', workers=None, host='127.0.0.1'):
+    """Runs the job service until interrupted."""
+    service = JobService(cache_dir, workers)
+    server = ThreadingHTTPServer((host, port), JobHandler)
+    server.daemon_threads = True
+    server.service = service
+    print(f'Simulation service on http://{host}:{port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+def submit(url, params, output=None):
+    """Submits a job to a running service, prints its progress and the total
+    results, and saves the text output if a file name is given.
+    """
+    request = urllib.request.Request(f'{url}/jobs', json.dumps(params).encode(),
+                                     {'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        state = json.load(response)
+    print(f'Job {state["job"]} {state["status"]}.')
+    with urllib.request.urlopen(f'{url}/jobs/{state["job"]}/progress') as response:
+        for line in response:
+            state = json.loads(line)
+            print(f'Progress: {state["progress"]}%', end='\r')
+    print()
+    if state['status'] != 'done':
+        print(f'Job failed: {state.get("error")}')
+        return
+    for win, count in state['total_wins'].items():
+        print(f'{win.title()}:\t{count}\t({round(count / state["game_count"] * 100, 4)}%)')
+    if output:
+        with urllib.request.urlopen(f'{url}/jobs/{state["job"]}/output') as response:
+            with open(output, 'wb') as sim_file:
+                shutil.copyfileobj(response, sim_file)
+
+def main():
+
+    # Argument parser
+    parser = argparse.ArgumentParser(description='Local simulation job service.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    server = commands.add_parser('serve', help='run the service')
+    server.add_argument('-p', action='store', dest='port', default=8377, type=int,
+                        help='port to listen on, default 8377')
+    server.add_argument('-w', action='store', dest='workers', default=None, type=int,
+                        help='number of worker processes, default one per CPU')
+    server.add_argument('--cache', action='store', dest='cache', default='sim-cache',
+                        help='directory of cached results, default sim-cache')
+    client = commands.add_parser('submit', help='submit a simulation')
+    client.add_argument('-s', action='store', dest='shoes', default=10000, type=int,
+                        help='number of shoes to be simulated, default 10000')
+    client.add_argument('-d', action='store', dest='decks', default=8, type=int,
+                        help='number of decks per shoe, default 8')
+    client.add_argument('--seed', action='store', dest='seed', default=0, type=int,
+                        help='seed of the simulation, default 0')
+    client.add_argument('--shuffle', action='store', dest='shuffle', default='perfect',
+                        choices=MODELS, help='shuffle model of the shoes, default perfect')
+    client.add_argument('-o', action='store', dest='output', default=None,
+                        help='save the text output to a file')
+    client.add_argument('--url', action='store', dest='url',
+                        default='http://127.0.0.1:8377', help='address of the service')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.port, args.cache, args.workers)
+    else:
+        submit(args.url, {'decks': args.decks, 'shoes': args.shoes,
+                          'seed': args.seed, 'shuffle': args.shuffle}, args.output)
+
+if __name__ == '__main__':
+    main()
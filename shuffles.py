@@ -0,0 +1,163 @@
+class PerfectShuffle:
+    """Uniformly random shuffle. Every order of the shoe is equally likely.
+
+    Shuffle models are called with the cards of a shoe, a bytearray of card
+    codes, and the random number generator of the shoe. They reorder the
+    cards in place.
+
+    Attributes:
+        continuous: bool, if the model puts back the dealt cards into the
+            shoe, as a continuous shuffling machine does.
+    """
+    continuous = False
+
+    def __call__(self, cards, rng):
+        rng.shuffle(cards)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}()'
+
+class RiffleShuffle(PerfectShuffle):
+    """Gilbert-Shannon-Reeds riffle shuffle. The cards are cut in two packets
+    with a binomial split and dropped from each packet with a probability
+    proportional to its size. A few passes leave a shoe far from random.
+
+    Args:
+        passes: int, number of riffles. Optional, default value 3.
+
+    Raises:
+        ValueError: If the number of passes is not positive.
+    """
+    def __init__(self, passes=3):
+        if passes < 1:
+            raise ValueError('Number of passes must be positive.')
+        self._passes = passes
+
+    @property
+    def passes(self):
+        """Returns the number of riffles."""
+        return self._passes
+
+    def __call__(self, cards, rng):
+        num_cards = len(cards)
+        for i in range(self._passes):
+            # Each position takes the next card of the top packet when its
+            # bit is set. The top packet size is then binomial and every
+            # interleaving of both packets is equally likely.
+            drops = rng.getrandbits(num_cards)
+            top = bin(drops).count('1')
+            left, right = cards[:top], cards[top:]
+            riffled = bytearray(num_cards)
+            i_left = i_right = 0
+            for position in range(num_cards):
+                if drops >> position & 1:
+                    riffled[position] = left[i_left]
+                    i_left += 1
+                else:
+                    riffled[position] = right[i_right]
+                    i_right += 1
+            cards[:] = riffled
+
+    def __repr__(self):
+        return f'RiffleShuffle({self._passes})'
+
+class StripShuffle(PerfectShuffle):
+    """Strip cut. Packets of random size are taken from the top and stacked on
+    a new pile, which reverses the order of the packets but not of the cards
+    within them.
+
+    Args:
+        packet: int, average packet size in cards. Optional, default value 52.
+
+    Raises:
+        ValueError: If the packet size is not positive.
+    """
+    def __init__(self, packet=52):
+        if packet < 1:
+            raise ValueError('Packet size must be positive.')
+        self._packet = packet
+
+    @property
+    def packet(self):
+        """Returns the average packet size."""
+        return self._packet
+
+    def __call__(self, cards, rng):
+        packets = []
+        start = 0
+        while start < len(cards):
+            size = rng.randint(1, 2 * self._packet - 1)
+            packets.append(cards[start:start + size])
+            start += size
+        packets.reverse()
+        cards[:] = b''.join(packets)
+
+    def __repr__(self):
+        return f'StripShuffle({self._packet})'
+
+class SequenceShuffle(PerfectShuffle):
+    """Applies several shuffle models in order, such as the riffles, strips
+    and cuts of a hand shuffling procedure.
+
+    Args:
+        models: shuffle models to apply.
+    """
+    def __init__(self, *models):
+        self._models = models
+
+    def __call__(self, cards, rng):
+        for model in self._models:
+            model(cards, rng)
+
+    def __repr__(self):
+        return f'SequenceShuffle({", ".join(repr(m) for m in self._models)})'
+
+class ContinuousShuffle(PerfectShuffle):
+    """Continuous shuffling machine. The shoe is shuffled once and the dealt
+    cards are put back at random positions every time batch cards were
+    dealt, so the shoe never runs out.
+
+    Args:
+        batch: int, number of dealt cards collected before they are put back.
+            Optional, default value 6, the cards of a coup at most.
+
+    Raises:
+        ValueError: If the batch is not positive.
+    """
+    continuous = True
+
+    def __init__(self, batch=6):
+        if batch < 1:
+            raise ValueError('Batch must be positive.')
+        self._batch = batch
+
+    @property
+    def batch(self):
+        """Returns the number of cards put back at once."""
+        return self._batch
+
+    def reinsert(self, cards, discards, rng):
+        """Puts back the discards at random positions of the shoe."""
+        for code in discards:
+            cards.insert(rng.randrange(len(cards) + 1), code)
+
+    def __repr__(self):
+        return f'ContinuousShuffle({self._batch})'
+
+MODELS = {
+    'perfect': PerfectShuffle,
+    'riffle': RiffleShuffle,
+    'strip': StripShuffle,
+    'hand': lambda: SequenceShuffle(RiffleShuffle(2), StripShuffle(), RiffleShuffle(1)),
+    'csm': ContinuousShuffle
+    }
+
+def find_model(representation):
+    """Returns a new instance of the model on MODELS with a representation,
+    as written by repr(), or None if there is none.
+    """
+    for factory in MODELS.values():
+        model = factory()
+        if repr(model) == representation:
+            return model
+    return None
@@ -0,0 +1,100 @@
+import random
+from rules import Game
+from shuffles import MODELS
+
+def hand_values(hand):
+    """Creates a list of strings with the values of a hand."""
+    values = []
+    for i in range(3):
+        try:
+            values.append(str(hand[i]))
+        except IndexError:
+            values.append('x')
+    return values
+
+def shoe_rng(seed, shoe):
+    """Returns the random number generator of a shoe on a seeded simulation.
+    Each shoe has its own, so any range of shoes can be played apart and
+    still deal the same cards.
+
+    Args:
+        seed: int, seed of the simulation.
+        shoe: int, sequential number of the shoe, starting at 0.
+    """
+    return random.Random(f'{seed}:{shoe}')
+
+def play_shoes(sim_file, decks, start, stop, shuffle='perfect', seed=None,
+               history=None, progress=None, depth=None):
+    """Plays a range of shoes and writes the results of each coup and shoe
+    as text.
+
+    Args:
+        sim_file: file object, where the results are written.
+        decks: int, number of decks per shoe.
+        start: int, number of the first shoe, starting at 0.
+        stop: int, number of the shoe after the last one.
+        shuffle: str, name of the shuffle model on shuffles.MODELS. Optional,
+            default perfect.
+        seed: int, seed of the simulation. Optional, without it the shoes are
+            shuffled with the random module.
+        history: CoupHistory, where the coups are also recorded. Optional.
+        progress: callable, called with the number of shoes played after
+            each shoe. Optional.
+        depth: DepthProfile, where the coups are counted by shoe depth.
+            Optional.
+
+    Returns:
+        tuple, dict with the total wins of each hand and the number of coups.
+    """
+    game_count = 0
+    total_wins = {'banco': 0, 'punto': 0, 'tie': 0}
+    model = MODELS[shuffle]()
+    sim = Game(decks)
+
+    for i in range(start, stop):
+        shoe_wins = {'banco': 0, 'punto': 0, 'tie': 0}
+        sim.create_shoe(decks, model, shoe_rng(seed, i) if seed is not None else None)
+        sim_file.write(f'\nShoe number {i + 1}\n\n')
+
+        # While the shoe has more than 5 cards. Continuous shuffles never
+        # run out, so the cards dealt are counted instead
+        while decks * 52 - sim.num_dealt >= 6:
+            result = []
+            game_count += 1
+
+            # Baccarat game
+            cards_left = sim.num_cards
+            sim.deal_hands()
+            if not sim.is_natural():
+                sim.draw_thirds()
+            game_result = sim.game_result()
+            shoe_wins[game_result] += 1
+            total_wins[game_result] += 1
+            if history is not None:
+                history.record(sim, i, cards_left)
+            if depth is not None:
+                depth.record_game(sim, cards_left)
+
+            # Append to results list
+            result.append(game_result.title()[0])
+            result.append(str(sim.banco_value))
+            result.append(str(sim.punto_value))
+            result.extend(hand_values(sim.banco_values))
+            result.extend(hand_values(sim.punto_values))
+            sim_file.write(','.join(result) + '\n')
+
+        # Shoe results
+        sim_file.write('\nShoe results:\n')
+        for win in shoe_wins:
+            sim_file.write(f'{win.title()}:\t{shoe_wins[win]}\n')
+        if progress is not None:
+            progress(i + 1 - start)
+
+    return total_wins, game_count
+
+def write_totals(sim_file, total_wins, game_count):
+    """Writes the total results of a simulation."""
+    sim_file.write('\nTotal results:\n')
+    for win in total_wins:
+        sim_file.write(f'{win.title()}:\t{total_wins[win]}\t\
+({round((total_wins[win]/game_count) * 100, 4)}%)\n')
@@ -0,0 +1,197 @@
+import argparse
+import os
+import struct
+import zlib
+from collections import namedtuple
+
+_MAGIC = b'BCTS'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sH')
+_BYTE = struct.Struct('<B')
+_GAME = struct.Struct('<HIQ???')
+_RNG = struct.Struct('<625I?d')
+_COUNT = struct.Struct('<I')
+_PLAYER = struct.Struct('<IqBq')
+_BET = struct.Struct('<IBq')
+_CRC = struct.Struct('<I')
+
+HANDS = [None, 'punto', 'banco', 'tie']
+_HAND_CODES = {hand: code for code, hand in enumerate(HANDS)}
+
+TableState = namedtuple('TableState', [
+    'num_decks', 'coup', 'num_dealt', 'running', 'bets_open', 'shuffle',
+    'cards', 'discards', 'punto', 'banco', 'rng_state', 'players',
+    'window_bets', 'bet_batch'])
+TableState.__doc__ = """State of a Table, as taken by Table.snapshot().
+
+    num_decks: int, number of decks of the shoe.
+    coup: int, number of coups dealt.
+    num_dealt: int, number of cards drawn from the shoe.
+    running: bool, if a coup is being dealt.
+    bets_open: bool, if bets are accepted.
+    shuffle: str, representation of the shuffle model of the shoe.
+    cards: bytes, card codes left on the shoe.
+    discards: bytes, card codes waiting to be put back by a continuous shuffle.
+    punto: bytes, card codes of punto hand, empty if no hands were dealt.
+    banco: bytes, card codes of banco hand, empty if no hands were dealt.
+    rng_state: tuple, state of the random number generator of the shoe as
+        returned by getstate(), or None.
+    players: list, tuples of pid, balance, hand bet and amount bet.
+    window_bets: dict, bets accepted on the open betting window, by player
+        index, as tuples of hand and amount.
+    bet_batch: dict, bets of the last closed betting window, in the same way.
+"""
+
+def _pack_bytes(size, data):
+    return size.pack(len(data)) + data
+
+def _pack_bets(bets):
+    return _COUNT.pack(len(bets)) + b''.join(
+        _BET.pack(player_i, _HAND_CODES[hand], amount)
+        for player_i, (hand, amount) in bets.items())
+
+def pack(state):
+    """Encodes a TableState as a compact binary snapshot. The snapshot ends
+    with a CRC32 of its contents, so torn or damaged files are detected.
+
+    Returns:
+        bytes, the snapshot.
+    """
+    parts = [_HEADER.pack(_MAGIC, VERSION),
+             _GAME.pack(state.num_decks, state.coup, state.num_dealt,
+                        state.running, state.bets_open, state.rng_state is not None),
+             _pack_bytes(_BYTE, state.shuffle.encode()),
+             _pack_bytes(_COUNT, state.cards),
+             _pack_bytes(_COUNT, state.discards),
+             _pack_bytes(_BYTE, state.punto),
+             _pack_bytes(_BYTE, state.banco)]
+    if state.rng_state is not None:
+        version, internal, gauss = state.rng_state
+        parts.append(_RNG.pack(*internal, gauss is not None, gauss or 0.0))
+    parts.append(_COUNT.pack(len(state.players)))
+    parts.extend(_PLAYER.pack(pid, balance, _HAND_CODES[hand], amount)
+                 for pid, balance, hand, amount in state.players)
+    parts.append(_pack_bets(state.window_bets))
+    parts.append(_pack_bets(state.bet_batch))
+    data = b''.join(parts)
+    return data + _CRC.pack(zlib.crc32(data))
+
+class _Reader:
+    """Reads the fields of a snapshot in order."""
+    def __init__(self, data):
+        self._data = data
+        self._offset = 0
+
+    def unpack(self, layout):
+        values = layout.unpack_from(self._data, self._offset)
+        self._offset += layout.size
+        return values
+
+    def bytes(self, size):
+        length, = self.unpack(size)
+        self._offset += length
+        if self._offset > len(self._data):
+            raise ValueError('Truncated table snapshot.')
+        return bytes(self._data[self._offset - length:self._offset])
+
+    def bets(self):
+        count, = self.unpack(_COUNT)
+        bets = {}
+        for i in range(count):
+            player_i, hand, amount = self.unpack(_BET)
+            bets[player_i] = (HANDS[hand], amount)
+        return bets
+
+def unpack(data):
+    """Decodes a snapshot written by pack().
+
+    Returns:
+        TableState, the state of the table.
+
+    Raises:
+        ValueError: If the data is not a table snapshot, has an unsupported
+            version or is damaged.
+    """
+    if len(data) < _HEADER.size + _CRC.size:
+        raise ValueError('Not a table snapshot.')
+    magic, version = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError('Not a table snapshot.')
+    if version != VERSION:
+        raise ValueError(f'Unsupported table snapshot version {version}.')
+    crc, = _CRC.unpack_from(data, len(data) - _CRC.size)
+    if zlib.crc32(memoryview(data)[:-_CRC.size]) != crc:
+        raise ValueError('Damaged table snapshot.')
+    reader = _Reader(data)
+    reader.unpack(_HEADER)
+    try:
+        num_decks, coup, num_dealt, running, bets_open, has_rng = reader.unpack(_GAME)
+        shuffle = reader.bytes(_BYTE).decode()
+        cards = reader.bytes(_COUNT)
+        discards = reader.bytes(_COUNT)
+        punto = reader.bytes(_BYTE)
+        banco = reader.bytes(_BYTE)
+        rng_state = None
+        if has_rng:
+            *internal, has_gauss, gauss = reader.unpack(_RNG)
+            rng_state = (3, tuple(internal), gauss if has_gauss else None)
+        count, = reader.unpack(_COUNT)
+        players = []
+        for i in range(count):
+            pid, balance, hand, amount = reader.unpack(_PLAYER)
+            players.append((pid, balance, HANDS[hand], amount))
+        window_bets = reader.bets()
+        bet_batch = reader.bets()
+    except (struct.error, IndexError):
+        raise ValueError('Truncated table snapshot.')
+    return TableState(num_decks, coup, num_dealt, running, bets_open, shuffle,
+                      cards, discards, punto, banco, rng_state, players,
+                      window_bets, bet_batch)
+
+def write(file_name, data, sync=False):
+    """Writes a snapshot to a file. The file is replaced atomically, so a
+    reader always finds a whole snapshot.
+
+    Args:
+        file_name: str, path of the snapshot file.
+        data: bytes, the snapshot.
+        sync: bool, wait until the snapshot is on disk, to survive a crash
+            of the machine and not only of the process. Optional, default
+            False.
+    """
+    temp_name = f'{file_name}.tmp'
+    with open(temp_name, 'wb') as snapshot_file:
+        snapshot_file.write(data)
+        if sync:
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+    os.replace(temp_name, file_name)
+
+def read(file_name):
+    """Reads a snapshot file written by write()."""
+    with open(file_name, 'rb') as snapshot_file:
+        return snapshot_file.read()
+
+def main():
+
+    # Argument parser
+    parser = argparse.ArgumentParser(description='Shows the state of a table '
+                                     'snapshot.')
+    parser.add_argument('file', help='snapshot file')
+    args = parser.parse_args()
+
+    data = read(args.file)
+    state = unpack(data)
+    print(f'Snapshot version {VERSION}, {len(data)} bytes.')
+    print(f'Shoe:\t\t{state.num_decks} decks, {state.shuffle}, '
+          f'{len(state.cards)} cards left, {state.num_dealt} dealt')
+    print(f'Coup:\t\t{state.coup}, {"running" if state.running else "closed"}')
+    print(f'Bets:\t\t{"open" if state.bets_open else "closed"}, '
+          f'{len(state.window_bets)} accepted, {len(state.bet_batch)} on last batch')
+    for pid, balance, hand, amount in state.players:
+        bet = f', {amount} on {hand}' if hand else ''
+        print(f'Player {pid}:\tbalance {balance}{bet}')
+
+if __name__ == '__main__':
+    main()
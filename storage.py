@@ -0,0 +1,133 @@
+import sqlite3
+from writebehind import WriteBehind
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS players (
+    pid INTEGER PRIMARY KEY,
+    balance INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pid INTEGER NOT NULL REFERENCES players(pid),
+    coup INTEGER NOT NULL,
+    hand TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    balance INTEGER NOT NULL
+);
+'''
+
+class PlayerStore(WriteBehind):
+    """Persistent player balances and bet history on a SQLite file.
+
+    Writes are queued in memory and committed by a background thread once
+    batch records are pending or every interval seconds, so recording a bet
+    never waits for the disk. Each batch is committed in one transaction,
+    after a crash the file holds the state of the last committed batch. A
+    batch that fails to commit is kept and committed with the next one, and
+    its error is raised by raise_error() meanwhile. Subclass of WriteBehind.
+
+    Args:
+        file_name: str, path of the SQLite file. Created if it does not exist.
+        batch: int, pending records that trigger a commit. Optional, default
+            value 100.
+        interval: float, maximum seconds between commits. Optional, default
+            value 1.0.
+
+    Attributes:
+        file_name: str, path of the SQLite file.
+        pending: int, number of records waiting to be committed.
+    """
+    def __init__(self, file_name, batch=100, interval=1.0):
+        self._file_name = file_name
+        self._connection = sqlite3.connect(file_name, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_SCHEMA)
+        self._balances = {}
+        self._bets = []
+        WriteBehind.__init__(self, batch, interval)
+
+    @property
+    def file_name(self):
+        """Returns the path of the SQLite file."""
+        return self._file_name
+
+    @property
+    def pending(self):
+        """Returns the number of records waiting to be committed."""
+        with self._lock:
+            return len(self._balances) + len(self._bets)
+
+    def load_players(self):
+        """Reads the committed players.
+
+        Returns:
+            list, with a tuple of pid and balance for every player, in pid order.
+        """
+        with self._flush_lock:
+            cursor = self._connection.execute(
+                'SELECT pid, balance FROM players ORDER BY pid')
+            return cursor.fetchall()
+
+    def bet_history(self, pid=None):
+        """Reads the committed bets, of one player if a pid is given.
+
+        Returns:
+            list, with a tuple of pid, coup, hand, amount, result and balance
+                for every bet, in settlement order.
+        """
+        query = 'SELECT pid, coup, hand, amount, result, balance FROM bets'
+        with self._flush_lock:
+            if pid is None:
+                cursor = self._connection.execute(query + ' ORDER BY id')
+            else:
+                cursor = self._connection.execute(
+                    query + ' WHERE pid = ? ORDER BY id', (pid,))
+            return cursor.fetchall()
+
+    def save_player(self, pid, balance):
+        """Queues the balance of a player."""
+        with self._lock:
+            self._balances[pid] = balance
+            pending = len(self._balances) + len(self._bets)
+        self._queued(pending)
+
+    def record_bet(self, pid, coup, hand, amount, result, balance):
+        """Queues a settled bet together with the new balance of the player."""
+        with self._lock:
+            self._bets.append((pid, coup, hand, amount, result, balance))
+            self._balances[pid] = balance
+            pending = len(self._balances) + len(self._bets)
+        self._queued(pending)
+
+    def _write_pending(self):
+        """Commits the pending records in one transaction."""
+        with self._lock:
+            balances, self._balances = self._balances, {}
+            bets, self._bets = self._bets, []
+        if not balances and not bets:
+            return
+        try:
+            with self._connection:
+                self._connection.executemany(
+                    'INSERT INTO players (pid, balance) VALUES (?, ?) '
+                    'ON CONFLICT(pid) DO UPDATE SET balance = excluded.balance',
+                    balances.items())
+                self._connection.executemany(
+                    'INSERT INTO bets (pid, coup, hand, amount, result, balance) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', bets)
+        except sqlite3.Error:
+            # Put the records back ahead of the ones queued meanwhile
+            with self._lock:
+                balances.update(self._balances)
+                self._balances = balances
+                self._bets = bets + self._bets
+            raise
+
+    def _close(self):
+        """Closes the SQLite file."""
+        self._connection.close()
+
+    def __repr__(self):
+        return f'PlayerStore(\'{self._file_name}\')'
@@ -0,0 +1,72 @@
+import io
+import os
+import socket
+import tempfile
+import threading
+import unittest
+import distributed
+from distributed import CoordinatorServer, coordinate, receive, send, work
+from simulation import play_shoes, write_totals
+
+PARAMS = {'decks': 8, 'shoes': 12, 'seed': 7, 'shuffle': 'perfect'}
+
+def single_process():
+    """Returns the output of the simulation played in one process."""
+    sim_file = io.StringIO()
+    total_wins, game_count = play_shoes(sim_file, PARAMS['decks'], 0, PARAMS['shoes'],
+                                        PARAMS['shuffle'], PARAMS['seed'])
+    write_totals(sim_file, total_wins, game_count)
+    return sim_file.getvalue()
+
+def crash_once(host, port):
+    """Worker that exits at once the first time, marked by a file."""
+    if not os.path.exists(MARKER):
+        open(MARKER, 'w').close()
+        os._exit(1)
+    work(host, port)
+
+def crash(host, port):
+    """Worker that always exits at once."""
+    os._exit(1)
+
+class TestCoordinator(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(setattr, distributed, 'work', work)
+
+    def test_worker_disconnects(self):
+        server = CoordinatorServer(('127.0.0.1', 0), PARAMS, part=5)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        with socket.create_connection(server.server_address) as connection, \
+                connection.makefile('rwb') as stream:
+            send(stream, {'type': 'ready'})
+            message = receive(stream)
+        self.assertEqual((message['start'], message['stop']), (0, 5))
+        work(*server.server_address, retry=0.01)
+        coordinator = server.coordinator
+        self.assertTrue(coordinator.finished)
+        sim_file = io.StringIO()
+        coordinator.write(sim_file)
+        self.assertEqual(sim_file.getvalue(), single_process())
+
+    def test_local_worker_restarted(self):
+        global MARKER
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        MARKER = os.path.join(directory.name, 'crashed')
+        distributed.work = crash_once
+        sim_file = io.StringIO()
+        coordinate(sim_file, PARAMS, 0, part=5, local_workers=1)
+        self.assertTrue(os.path.exists(MARKER))
+        self.assertEqual(sim_file.getvalue(), single_process())
+
+    def test_local_workers_exit(self):
+        distributed.work = crash
+        with self.assertRaises(RuntimeError):
+            coordinate(io.StringIO(), PARAMS, 0, part=5, local_workers=2)
+
+if __name__ == '__main__':
+    unittest.main()
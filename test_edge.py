@@ -0,0 +1,72 @@
+import unittest
+from fractions import Fraction
+from itertools import permutations
+from cards import Shoe
+from edge import house_edges, outcome_probabilities, value_card
+from hands import Banco, Punto
+
+SEQUENCES = 416 * 415 * 414 * 413 * 412 * 411
+
+class StandOnThree(Banco):
+    """Banco variant that stands on 3 against a punto third 8 or 9."""
+    third_card_rules = {**Banco.third_card_rules, 3: [0, 1, 2, 3, 4, 5, 6, 7]}
+
+def brute_probabilities(composition, banco_class=Banco):
+    """Computes the outcome probabilities by dealing every ordered sequence
+    of six cards with the hand classes.
+    """
+    cards = [value_card(value) for value, count in enumerate(composition)
+             for i in range(count)]
+    counts = {'banco': 0, 'punto': 0, 'tie': 0}
+    sequences = 0
+    for sequence in permutations(cards, 6):
+        punto = Punto(list(sequence[0:2]))
+        banco = banco_class(list(sequence[2:4]))
+        if not punto.is_natural() and not banco.is_natural():
+            if punto.draw_third():
+                punto.add_cards([sequence[4]])
+                if banco.draw_third(sequence[4]):
+                    banco.add_cards([sequence[5]])
+            elif banco.draw_third():
+                banco.add_cards([sequence[4]])
+        punto_value, banco_value = punto.value % 10, banco.value % 10
+        outcome = 'banco' if banco_value > punto_value else \
+            'punto' if punto_value > banco_value else 'tie'
+        counts[outcome] += 1
+        sequences += 1
+    return {outcome: Fraction(count, sequences) for outcome, count in counts.items()}
+
+class TestOutcomeProbabilities(unittest.TestCase):
+
+    def test_eight_decks(self):
+        probabilities = outcome_probabilities(Shoe(8).composition, processes=1)
+        self.assertEqual(probabilities, {
+            'banco': Fraction(2292252566437888, SEQUENCES),
+            'punto': Fraction(2230518282592256, SEQUENCES),
+            'tie': Fraction(475627426473216, SEQUENCES)})
+        self.assertEqual(outcome_probabilities(Shoe(8).composition, processes=2),
+                         probabilities)
+        edges = house_edges(probabilities)
+        self.assertEqual(round(float(edges['banco']) * 100, 4), 1.0579)
+        self.assertEqual(round(float(edges['punto']) * 100, 4), 1.2351)
+        self.assertEqual(round(float(edges['tie']) * 100, 4), 14.3596)
+
+    def test_small_shoes(self):
+        for composition in ([3, 1, 1, 0, 1, 1, 1, 0, 1, 0],
+                            [1, 0, 2, 1, 1, 1, 1, 1, 0, 1]):
+            self.assertEqual(outcome_probabilities(composition, processes=1),
+                             brute_probabilities(composition))
+
+    def test_banco_variant(self):
+        composition = [2, 1, 1, 2, 0, 1, 0, 0, 1, 1]
+        probabilities = outcome_probabilities(composition, banco_class=StandOnThree,
+                                              processes=1)
+        self.assertEqual(probabilities, brute_probabilities(composition, StandOnThree))
+        self.assertNotEqual(probabilities, outcome_probabilities(composition, processes=1))
+        eight_decks = outcome_probabilities(Shoe(8).composition, banco_class=StandOnThree,
+                                            processes=1)
+        self.assertEqual(sum(eight_decks.values()), 1)
+        self.assertGreater(eight_decks['punto'], Fraction(2230518282592256, SEQUENCES))
+
+if __name__ == '__main__':
+    unittest.main()
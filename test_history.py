@@ -0,0 +1,81 @@
+import io
+import os
+import tempfile
+import unittest
+from history import CoupHistory, OUTCOMES
+from simulation import play_shoes
+
+QUERIES = [(run, cards_left, card)
+           for run in (None, ('punto', 2), ('tie', 1))
+           for cards_left in (None, (0, 40), (100, 300))
+           for card in (None, ('banco', 9), ('punto', 0))]
+
+def brute_select(coups, run, cards_left, card):
+    """Selects the coups matching a query by walking all of them."""
+    selected = []
+    run_outcome, run_length = None, 0
+    for i, (shoe, left, outcome, banco, punto) in enumerate(coups):
+        if i and coups[i - 1][0] == shoe:
+            previous = coups[i - 1][2]
+            run_length = run_length + 1 if previous == run_outcome else 1
+            run_outcome = previous
+        else:
+            run_outcome, run_length = None, 0
+        if run is not None and (run_outcome != run[0] or run_length < run[1]):
+            continue
+        if cards_left is not None and not cards_left[0] <= left <= cards_left[1]:
+            continue
+        if card is not None and card[1] not in (banco if card[0] == 'banco' else punto):
+            continue
+        selected.append(i)
+    return selected
+
+class TestCoupHistory(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.file_name = os.path.join(directory.name, 'coups.hist')
+
+    def check(self, history, coups):
+        self.assertEqual(history.num_coups, len(coups))
+        for query in QUERIES:
+            selected = brute_select(coups, *query)
+            self.assertEqual(history.select(*query), selected)
+            counts = dict.fromkeys(OUTCOMES, 0)
+            for i in selected:
+                counts[coups[i][2]] += 1
+            self.assertEqual(history.count(*query), counts)
+
+    def test_queries(self):
+        history = CoupHistory(segment_size=500)
+        play_shoes(io.StringIO(), 8, 0, 30, seed=3, history=history)
+        coups = [history.coup(i) for i in range(history.num_coups)]
+        self.assertEqual(history.num_shoes, 30)
+        self.check(history, coups)
+        history.save(self.file_name)
+        self.check(CoupHistory.load(self.file_name), coups)
+
+    def test_written_while_recording(self):
+        memory = CoupHistory()
+        play_shoes(io.StringIO(), 6, 0, 20, seed=4, history=memory)
+        coups = [memory.coup(i) for i in range(memory.num_coups)]
+        with CoupHistory(self.file_name, segment_size=300) as history:
+            play_shoes(io.StringIO(), 6, 0, 10, seed=4, history=history)
+        # A loaded history goes on with the runs of its last shoe
+        history = CoupHistory.load(self.file_name)
+        play_shoes(io.StringIO(), 6, 10, 20, seed=4, history=history)
+        self.check(history, coups)
+        self.assertEqual([history.coup(i) for i in (0, 299, 300, len(coups) - 1)],
+                         [coups[i] for i in (0, 299, 300, len(coups) - 1)])
+
+    def test_unfinished_file(self):
+        history = CoupHistory(self.file_name, segment_size=100)
+        play_shoes(io.StringIO(), 8, 0, 3, seed=5, history=history)
+        with self.assertRaises(ValueError):
+            CoupHistory.load(self.file_name)
+        history.close()
+        self.assertEqual(CoupHistory.load(self.file_name).num_coups, history.num_coups)
+
+if __name__ == '__main__':
+    unittest.main()
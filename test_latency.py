@@ -0,0 +1,70 @@
+import gc
+import sys
+import threading
+import time
+import unittest
+from latency import LatencyMonitor
+
+def bucket_bounds(text):
+    """Returns the le labels of an export."""
+    return [line.split('le="')[1].split('"')[0]
+            for line in text.splitlines() if '_bucket{' in line]
+
+class TestLatencyMonitor(unittest.TestCase):
+
+    def test_finished_threads(self):
+        monitor = LatencyMonitor()
+
+        def record(i):
+            for value in range(100):
+                monitor.record('bet', 1000 * i + value)
+            if i % 2:
+                monitor.record('deal_hands', 50_000)
+
+        threads = [threading.Thread(target=record, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        gc.collect()
+        deadline = time.monotonic() + 5
+        while monitor._recorders and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(monitor._recorders, {})
+        self.assertEqual(monitor['bet'].count, 2000)
+        self.assertEqual(monitor['bet'].min, 0)
+        self.assertEqual(monitor['deal_hands'].count, 10)
+        self.assertEqual(monitor['draw_thirds'].count, 0)
+        monitor.reset()
+        self.assertEqual(monitor['bet'].count, 0)
+
+    def test_reset_while_recording(self):
+        monitor = LatencyMonitor([f'stage{i}' for i in range(2000)])
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+        # The thread adds a histogram per stage while reset walks them
+        recorder = threading.Thread(
+            target=lambda: [monitor.record(stage, 10) for stage in monitor.stages])
+        recorder.start()
+        try:
+            while recorder.is_alive():
+                monitor.reset()
+        finally:
+            recorder.join()
+
+    def test_stable_export(self):
+        monitor = LatencyMonitor()
+        empty = monitor.export()
+        for value in (0, 1, 31, 32, 1000, 999_999, 10 ** 12):
+            monitor.record('bet', value)
+        text = monitor.export()
+        self.assertEqual(bucket_bounds(text), bucket_bounds(empty))
+        counts = [int(line.split()[-1]) for line in text.splitlines()
+                  if line.startswith('baccarat_table_latency_seconds_bucket{stage="bet"')]
+        self.assertEqual(counts, sorted(counts))
+        self.assertIn('le="3.1e-08"} 3\n', text)
+        self.assertIn('le="1.023e-06"} 5\n', text)
+        self.assertIn('le="+Inf"} 7\n', text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+import ledger
+from ledger import ENTRY_SIZE, Ledger
+from players import Player
+from rules import Table
+from storage import PlayerStore
+from test_storage import FailingConnection
+
+class TestLedger(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.file_name = os.path.join(directory.name, 'bets.ledger')
+
+    def write_entries(self, entries):
+        with Ledger(self.file_name) as bet_ledger:
+            bet_ledger.open_balance(1, 1000)
+            for coup in range(1, entries + 1):
+                bet_ledger.record_settlement(coup, 1, 'punto', 10, 'win', 10,
+                                             1000 + 10 * coup)
+
+    def test_torn_tail(self):
+        self.write_entries(10)
+        size = os.path.getsize(self.file_name)
+        with open(self.file_name, 'ab') as ledger_file:
+            ledger_file.write(b'\x00' * (ENTRY_SIZE // 2))
+        with Ledger(self.file_name) as bet_ledger:
+            self.assertEqual(os.path.getsize(self.file_name), size)
+            self.assertEqual(bet_ledger.last_seq, 11)
+            bet_ledger.record_settlement(11, 1, 'banco', 20, 'lose', -20, 1080)
+        entries = ledger.read_entries(self.file_name)
+        self.assertEqual([entry[0] for entry in entries], list(range(1, 13)))
+        self.assertEqual(ledger.replay(self.file_name), ({1: 1080}, 11, []))
+
+    def test_damaged_entry(self):
+        self.write_entries(5)
+        with open(self.file_name, 'r+b') as ledger_file:
+            ledger_file.seek(-ENTRY_SIZE - 1, os.SEEK_END)
+            ledger_file.write(b'\xff')
+        with Ledger(self.file_name) as bet_ledger:
+            self.assertEqual(bet_ledger.last_seq, 4)
+        self.assertEqual(ledger.replay(self.file_name), ({1: 1030}, 3, []))
+
+    def test_open_known_balance(self):
+        self.write_entries(3)
+        with Ledger(self.file_name) as bet_ledger:
+            bet_ledger.open_balance(1, 1030)
+            bet_ledger.open_balance(2, 500)
+            bet_ledger.open_balance(2, 500)
+        self.assertEqual(len(ledger.read_entries(self.file_name)), 5)
+        with Ledger(self.file_name) as bet_ledger:
+            bet_ledger.open_balance(1, 2000)
+        balances, settlements, mismatches = ledger.replay(self.file_name)
+        self.assertEqual(balances, {1: 2000, 2: 500})
+        self.assertEqual(mismatches, [6])
+
+    def test_table_reopened(self):
+        with Ledger(self.file_name) as bet_ledger:
+            table = Table(8, ledger=bet_ledger)
+            table.add_player(100)
+            table.bet(0, 'punto', 10)
+            table.deal_hands()
+            if not table.is_natural():
+                table.draw_thirds()
+            table.settle_bets()
+            data = table.snapshot()
+        with Ledger(self.file_name) as bet_ledger:
+            Table.restore(data, ledger=bet_ledger)
+        entries = ledger.read_entries(self.file_name)
+        self.assertEqual([entry[3] for entry in entries], ['open', entries[1][3]])
+        self.assertEqual(ledger.replay(self.file_name)[2], [])
+
+    def test_failed_flush(self):
+        bet_ledger = Ledger(self.file_name, interval=0.01)
+        write = bet_ledger._write
+
+        def failing_write(data):
+            write(data[:ENTRY_SIZE + 3])
+            raise OSError('Disk full')
+
+        bet_ledger._write = failing_write
+        bet_ledger.open_balance(1, 1000)
+        with self.assertRaises(OSError):
+            bet_ledger.flush()
+        self.assertEqual(bet_ledger.pending, 1)
+        # Failures of the writer are kept for raise_error()
+        bet_ledger.record_settlement(1, 1, 'tie', 10, 'win', 80, 1080)
+        time.sleep(0.1)
+        self.assertEqual(bet_ledger.pending, 2)
+        with self.assertRaises(OSError):
+            bet_ledger.raise_error()
+        bet_ledger._write = write
+        bet_ledger.close()
+        entries = ledger.read_entries(self.file_name)
+        self.assertEqual([entry[0] for entry in entries], [1, 2])
+        self.assertEqual(ledger.replay(self.file_name), ({1: 1080}, 1, []))
+
+    def test_settle_with_failed_store(self):
+        store = PlayerStore(self.file_name + '.db', interval=60)
+        table = Table(8, store=store, ledger=Ledger(self.file_name))
+        for i in range(3):
+            table.add_player(1000)
+        connection = store._connection
+        store._connection = FailingConnection(connection)
+        with self.assertRaises(sqlite3.OperationalError):
+            store.flush()
+        for player_i in range(3):
+            table.bet(player_i, 'banco', 10)
+        table.deal_hands()
+        if not table.is_natural():
+            table.draw_thirds()
+        with self.assertRaises(sqlite3.OperationalError):
+            table.settle_bets()
+        store._connection = connection
+        table.close()
+        balances, settlements, mismatches = ledger.replay(self.file_name)
+        self.assertEqual(balances, {table._players[player_i].pid:
+                                    table._players[player_i].balance
+                                    for player_i in range(3)})
+        self.assertEqual((settlements, mismatches), (3, []))
+
+    def test_sessions_share_ledger(self):
+        self.addCleanup(setattr, Player, '_pid', Player._pid)
+        for session in range(2):
+            # Pids start again on every process
+            Player._pid = 1
+            with Ledger(self.file_name) as bet_ledger:
+                table = Table(8, ledger=bet_ledger)
+                table.add_player(100 * (session + 1))
+        balances, settlements, mismatches = ledger.replay(self.file_name)
+        self.assertEqual(sorted(balances.values()), [100, 200])
+        self.assertEqual(mismatches, [])
+
+    def test_failed_close(self):
+        bet_ledger = Ledger(self.file_name)
+        bet_ledger.open_balance(1, 1000)
+
+        def failing_write(data):
+            raise OSError('Disk full')
+
+        bet_ledger._write = failing_write
+        with self.assertRaises(OSError):
+            bet_ledger.close()
+        self.assertEqual(ledger.read_entries(self.file_name), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import threading
+import unittest
+from rules import BetWindow, GameError, Table
+
+class TestBetWindow(unittest.TestCase):
+
+    def setUp(self):
+        self.table = Table(8)
+        for i in range(50):
+            self.table.add_player(10000)
+
+    def test_bets_from_threads(self):
+        def bettor(player_i):
+            for amount in range(1, 101):
+                self.table.bet(player_i, 'punto', amount)
+
+        threads = [threading.Thread(target=bettor, args=(player_i,))
+                   for player_i in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.table.deal_hands()
+        self.assertEqual(self.table.bet_batch,
+                         {player_i: ('punto', 100) for player_i in range(50)})
+
+    def test_close_while_betting(self):
+        accepted = {}
+        start = threading.Event()
+        stop = threading.Event()
+
+        def bettor(player_i):
+            # Wait for all the bettors, busy ones could starve thread starts
+            start.wait()
+            amount = 0
+            while not stop.is_set():
+                amount = amount % 10000 + 1
+                try:
+                    self.table.bet(player_i, 'banco', amount)
+                except GameError:
+                    return
+                accepted[player_i] = ('banco', amount)
+
+        threads = [threading.Thread(target=bettor, args=(player_i,))
+                   for player_i in range(20)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        try:
+            self.table.deal_hands()
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        # Every accepted bet is on the batch, with the last amount accepted
+        self.assertEqual(self.table.bet_batch, accepted)
+        self.assertFalse(self.table.bets_open)
+
+    def test_bet_when_closed(self):
+        self.table.bet(0, 'tie', 10)
+        self.table.deal_hands()
+        with self.assertRaises(GameError):
+            self.table.bet(1, 'tie', 10)
+        if not self.table.is_natural():
+            self.table.draw_thirds()
+        self.table.settle_bets()
+        self.assertTrue(self.table.open_bets())
+        self.table.bet(1, 'tie', 10)
+
+    def test_invalid_bet_not_accepted(self):
+        with self.assertRaises(ValueError):
+            self.table.bet(0, 'banco', 20000)
+        self.table.deal_hands()
+        self.assertEqual(self.table.bet_batch, {})
+
+    def test_window(self):
+        window = BetWindow()
+        window.open()
+        self.assertEqual(window.close(), {})
+        with self.assertRaises(GameError):
+            window.close()
+        window.open()
+        self.assertTrue(window.is_open)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import random
+import sys
+import threading
+import unittest
+import snapshot
+from rules import Table
+from shuffles import ContinuousShuffle, RiffleShuffle
+
+def play_coups(table, coups):
+    """Plays coups with a bet of every player, returns what was dealt."""
+    dealt = []
+    for coup in range(coups):
+        for player_i in table.available_players:
+            table.bet(player_i, ['punto', 'banco', 'tie'][coup % 3], 1)
+        table.deal_hands()
+        if not table.is_natural():
+            table.draw_thirds()
+        dealt.append((table.punto_cards, table.banco_cards, table.settle_bets()))
+        table.open_bets()
+    return dealt
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.table = Table(8)
+        self.table.create_shoe(8, None, random.Random(1))
+        for balance in (100, 200, 300):
+            self.table.add_player(balance)
+
+    def test_restore_deals_same_cards(self):
+        play_coups(self.table, 10)
+        restored = Table.restore(self.table.snapshot())
+        self.assertEqual(play_coups(self.table, 50), play_coups(restored, 50))
+
+    def test_restore_mid_coup_with_open_bets(self):
+        self.table.bet(0, 'banco', 20)
+        self.table.bet(2, 'tie', 5)
+        self.table.deal_hands()
+        restored = Table.restore(self.table.snapshot())
+        self.assertEqual(restored.bet_batch, {0: ('banco', 20), 2: ('tie', 5)})
+        self.assertFalse(restored.bets_open)
+        self.assertEqual(restored.punto_cards, self.table.punto_cards)
+        for table in (self.table, restored):
+            if not table.is_natural():
+                table.draw_thirds()
+        self.assertEqual(restored.banco_cards, self.table.banco_cards)
+        self.assertEqual(restored.settle_bets(), self.table.settle_bets())
+        self.assertEqual([restored[i] for i in range(3)],
+                         [self.table[i] for i in range(3)])
+
+    def test_restore_accepted_bets(self):
+        self.table.bet(1, 'punto', 50)
+        restored = Table.restore(self.table.snapshot())
+        self.assertTrue(restored.bets_open)
+        self.assertEqual(restored[1], self.table[1])
+        restored.deal_hands()
+        self.assertEqual(restored.bet_batch, {1: ('punto', 50)})
+
+    def test_continuous_shuffle(self):
+        self.table.create_shoe(8, ContinuousShuffle(), random.Random(2))
+        play_coups(self.table, 7)
+        restored = Table.restore(self.table.snapshot())
+        self.assertEqual(play_coups(self.table, 30), play_coups(restored, 30))
+
+    def test_unknown_shuffle(self):
+        # Only the default riffle of three passes is on MODELS
+        self.table.create_shoe(1, RiffleShuffle(7))
+        data = self.table.snapshot()
+        with self.assertRaises(ValueError):
+            Table.restore(data)
+        restored = Table.restore(data, shuffle=RiffleShuffle(7))
+        self.assertEqual(restored.num_cards, 52)
+
+    def test_damaged(self):
+        data = self.table.snapshot()
+        for damaged in (data[:40], data[:-1], data[:20] + bytes([data[20] ^ 1]) + data[21:],
+                        b'XXXX' + data[4:]):
+            with self.assertRaises(ValueError):
+                Table.restore(damaged)
+
+    def test_unpack(self):
+        self.table.bet(0, 'tie', 3)
+        state = snapshot.unpack(self.table.snapshot())
+        self.assertEqual(state.num_decks, 8)
+        self.assertEqual(state.window_bets, {0: ('tie', 3)})
+        self.assertEqual([player[1:] for player in state.players],
+                         [(100, 'tie', 3), (200, None, 0), (300, None, 0)])
+
+    def test_snapshot_while_betting(self):
+        for i in range(20):
+            self.table.add_player(1000)
+        start = threading.Event()
+        stop = threading.Event()
+
+        def bettor(player_i):
+            start.wait()
+            while not stop.is_set():
+                self.table.bet(player_i, 'banco', random.randint(1, 100))
+
+        threads = [threading.Thread(target=bettor, args=(player_i,))
+                   for player_i in range(3, 23)]
+        # Switch threads often to catch bets half placed
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        for thread in threads:
+            thread.start()
+        start.set()
+        try:
+            for i in range(500):
+                state = snapshot.unpack(self.table.snapshot())
+                Table.restore(snapshot.pack(state))
+                for player_i, (hand, amount) in state.window_bets.items():
+                    self.assertEqual(state.players[player_i][2:], (hand, amount))
+        finally:
+            sys.setswitchinterval(interval)
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+if __name__ == '__main__':
+    unittest.main()
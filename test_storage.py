@@ -0,0 +1,88 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from rules import Table
+from storage import PlayerStore
+
+class FailingConnection:
+    """SQLite connection whose writes fail, as on a full disk."""
+    def __init__(self, connection):
+        self.connection = connection
+
+    def executemany(self, *args):
+        raise sqlite3.OperationalError('database or disk is full')
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def __enter__(self):
+        return self.connection.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.connection.__exit__(*exc_info)
+
+class TestPlayerStore(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.file_name = os.path.join(directory.name, 'players.db')
+
+    def test_reload(self):
+        with PlayerStore(self.file_name) as store:
+            store.save_player(1, 100)
+            store.record_bet(1, 1, 'banco', 10, 'win', 109)
+            store.save_player(2, 50)
+        with PlayerStore(self.file_name) as store:
+            self.assertEqual(store.load_players(), [(1, 109), (2, 50)])
+            self.assertEqual(store.bet_history(1), [(1, 1, 'banco', 10, 'win', 109)])
+
+    def test_failed_commit(self):
+        store = PlayerStore(self.file_name, interval=0.01)
+        connection = store._connection
+        store._connection = FailingConnection(connection)
+        store.save_player(1, 100)
+        with self.assertRaises(sqlite3.OperationalError):
+            store.flush()
+        store.record_bet(1, 1, 'punto', 10, 'lose', 90)
+        time.sleep(0.1)
+        self.assertEqual(store.pending, 2)
+        with self.assertRaises(sqlite3.OperationalError):
+            store.raise_error()
+        store.raise_error()
+        store._connection = connection
+        store.close()
+        with PlayerStore(self.file_name) as store:
+            self.assertEqual(store.load_players(), [(1, 90)])
+            self.assertEqual(len(store.bet_history()), 1)
+
+    def test_settle_with_failed_commit(self):
+        store = PlayerStore(self.file_name, interval=60)
+        table = Table(8, store=store)
+        for i in range(3):
+            table.add_player(100)
+        connection = store._connection
+        store._connection = FailingConnection(connection)
+        with self.assertRaises(sqlite3.OperationalError):
+            store.flush()
+        for player_i in range(3):
+            table.bet(player_i, 'tie', 10)
+        table.deal_hands()
+        if not table.is_natural():
+            table.draw_thirds()
+        # Every bet is settled before the error is raised
+        with self.assertRaises(sqlite3.OperationalError):
+            table.settle_bets()
+        self.assertEqual(table.valid_bets, [])
+        balances = [table._players[player_i].balance for player_i in range(3)]
+        store._connection = connection
+        table.close()
+        with PlayerStore(self.file_name) as store:
+            self.assertEqual([balance for pid, balance in store.load_players()],
+                             balances)
+            self.assertEqual(len(store.bet_history()), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import threading
+from abc import ABC, abstractmethod
+
+class WriteBehind(ABC):
+    """Base of the stores whose records are queued in memory and written by a
+    background thread once batch records are pending or every interval
+    seconds, so recording never waits for the disk.
+
+    Subclasses queue their records under the lock, call _queued() with the
+    number of pending records, and implement _write_pending(), which writes
+    the queued records and puts them back on the queue if the write fails,
+    and _close(), which closes the file. A write that fails on the background
+    thread is tried again on the next wake up. Queuing a record never raises,
+    so callers can finish their bookkeeping, the error is kept for
+    raise_error() until the records are written.
+
+    Args:
+        batch: int, pending records that trigger a write.
+        interval: float, maximum seconds between writes.
+    """
+    def __init__(self, batch, interval):
+        self._batch = batch
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._error = None
+        self._writer = threading.Thread(target=self._write_behind, daemon=True)
+        self._writer.start()
+
+    def _queued(self, pending):
+        """Wakes up the writer if a batch is pending."""
+        if pending >= self._batch:
+            self._wake.set()
+
+    def raise_error(self):
+        """Raises the error of the last failed write, once. The records of
+        the failed write are still pending.
+        """
+        with self._lock:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    @abstractmethod
+    def _write_pending(self):
+        """Writes the queued records."""
+
+    @abstractmethod
+    def _close(self):
+        """Closes the file."""
+
+    def flush(self):
+        """Writes the pending records."""
+        with self._flush_lock:
+            try:
+                self._write_pending()
+            except Exception as error:
+                with self._lock:
+                    self._error = error
+                raise
+            with self._lock:
+                self._error = None
+
+    def _write_behind(self):
+        """Writes the pending records whenever woken up or on every interval."""
+        while not self._closed:
+            self._wake.wait(self._interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # Kept for raise_error(), the records are written again
+                pass
+
+    def close(self):
+        """Writes the pending records and closes the file.
+
+        Raises:
+            Exception: The error of the last write, if it failed.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._writer.join()
+        try:
+            self.flush()
+        finally:
+            self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()